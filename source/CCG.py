@@ -1,20 +1,34 @@
-from typing import TypeVar, Optional
+from dataclasses import dataclass
+from typing import Callable, Iterable, TypeVar, Optional
 
 import cat
 import feature
 from node import Node, RuleSymbol
 from cat import Cat
 from assignment import SubstData, Assignment, SubstLink, SubstVal
-from feature import Feature
+from feature import Feature, FeatureSet
 from feature import FeatureValue as FV
 
 from lexicon.lexicon import constructPredicate
 from lexicon.template import defS, verb
+from unificationCache import UnificationCache
+
+"""
+The cache of the categories derived by the binary rules (or their failures).
+Since categories are hash-consed, the result of a rule depends only on the categories of the daughters.
+"""
+unificationCache = UnificationCache()
+
+"""
+The number of the changes of the unification mode (see `setUnificationMode`).
+A grammar discards the results in its cache when the number has changed since it started filling the cache.
+"""
+unificationModeGeneration = 0
 
 
 def unifiable(f1: list[Feature], f2: list[Feature]) -> bool:
     """checks if two lists of features are unifiable."""
-    return unifyFeatures([], f1, f2) is not None
+    return unifyFeatures(Assignment(), f1, f2) is not None
 
 
 def isBaseCategory(c: Cat) -> bool:
@@ -44,463 +58,839 @@ def isBaseCategory(c: Cat) -> bool:
 
 def isArgumentCategory(c: Cat) -> bool:
     """A test to check if a given category is an argument category (i.e. not a base category)."""
-    match c:
-        case cat.NP(_):
-            return not isNoncaseNP(c)
-        case cat.Sbar(_):
-            return True
-        case _:
-            return False
+    return c.isArgumentCategory
 
 
 def isTNoncaseNP(c: Cat) -> bool:
     """A test to check if a given category is NPnc."""
-    match c:
-        case cat.BS(cat.T(_, _, _), x):
-            return isNoncaseNP(x)
-        case _:
-            return False
+    return c.isTNoncaseNP
 
 
 def isNoncaseNP(c: Cat) -> bool:
     """A test to check if a given category is NPnc."""
-    match c:
-        case cat.NP([feature.F(v), *_]):
-            return FV.Nc in v
-        case cat.NP([feature.SF(_, v), *_]):
-            return FV.Nc in v
-        case _:
-            return False
+    return c.isNoncaseNP
 
 
 def isBunsetsu(c: Cat) -> bool:
     """A test to check if a given category is the one that can appear on the left adjacent of a punctuation."""
-    match c:
-        case cat.SL(x, _):
-            return isBunsetsu(x)
-        case cat.BS(x, _):
-            return isBunsetsu(x)
-        case cat.LPAREN:
-            return False
-        case cat.S([_, f, *_]):
-            match f:
-                case feature.F(feat):
-                    katsuyo = feat
-                case feature.SF(_, feat):
-                    katsuyo = feat
-            if not {FV.Cont, FV.Term, FV.Attr, FV.Hyp, FV.Imper, FV.Pre, FV.NTerm, FV.NStem, FV.TeForm, FV.NiForm} | set(katsuyo):
-                return False
-            else:
-                return True
-        case cat.N:
-            return False
-        case _:
-            return True
+    return c.isBunsetsu
 
 
 def endsWithT(c: Cat) -> bool:
-    match c:
-        case cat.SL(x, _):
-            return endsWithT(x)
-        case cat.T(_, _, _):
-            return True
-        case _:
-            return False
+    return c.endsWithT
 
 
 def isNStem(c: Cat) -> bool:
-    match c:
-        case cat.BS(x, _):
-            return isNStem(x)
-        case cat.S([_, f, *_]):
-            if unifyFeature([], f, feature.F([FV.NStem])):
-                return True
-            else:
-                return False
-        case _:
-            return False
+    return c.isNStem
 
 
-def unaryRules(_: Node, prevlist: list[Node]) -> list[Node]:
+"""
+The rules add the derived nodes to a sink, which is a list shared by all the rule applications for a cell:
+the nodes are appended in the order they are derived.
+The functions with `prevlist` return the new nodes in front of `prevlist`, the newest first,
+so that `prevlist` corresponds to a sink in reverse.
+"""
+
+
+def unaryRules(node: Node, prevlist: list[Node]) -> list[Node]:
     """The function to apply all the unaryRules to a CCG node."""
-    return prevlist
+    sink: list[Node] = []
+    unaryRulesInto(node, sink)
+    return sink[::-1] + prevlist
+
+
+def unaryRulesInto(_: Node, sink: list[Node]) -> None:
+    pass
 
 
 def binaryRules(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
-    return forwardFunctionCrossedSubstitutionRule(
-        lnode, rnode,
-        forwardFunctionCrossedComposition2Rule(
-            lnode, rnode,
-            forwardFunctionCrossedComposition1Rule(
-                lnode, rnode,
-                backwardFunctionComposition3Rule(
-                    lnode, rnode,
-                    backwardFunctionComposition2Rule(
-                        lnode, rnode,
-                        forwardFunctionComposition2Rule(
-                            lnode, rnode,
-                            backwardFunctionComposition1Rule(
-                                lnode, rnode,
-                                forwardFunctionComposition1Rule(
-                                    lnode, rnode,
-                                    backwardFunctionApplicationRule(
-                                        lnode, rnode,
-                                        forwardFunctionApplicationRule(
-                                            lnode, rnode, prevlist
-                                        )
-                                    )
-                                )
-                            )
-                        )
-                    )
-                )
-            )
-        )
+    """The function to apply all the binary rules to a pair of CCG nodes."""
+    sink: list[Node] = []
+    binaryRulesInto(lnode, rnode, sink)
+    return sink[::-1] + prevlist
+
+
+def binaryRulesInto(lnode: Node, rnode: Node, sink: list[Node]) -> None:
+    """`Grammar.binaryRulesInto` by `defaultGrammar`."""
+    defaultGrammar.binaryRulesInto(lnode, rnode, sink)
+
+
+def applyBinaryRuleInto(rule: "BinaryRule", lnode: Node, rnode: Node, sink: list[Node]) -> None:
+    defaultGrammar.applyBinaryRuleInto(rule, lnode, rnode, sink)
+
+
+class NodeIndex:
+    """
+    An index of the nodes of a chart cell for `binaryRulesJoinInto` and `coordinationRuleJoinInto`.
+    The positions of the nodes are grouped by each key of the binary rules (see `BinaryRule`), and
+    the nodes are counted by the class of the category and the rule symbol (the key of `binaryRuleDispatch`).
+    The tables are built when they are first looked up.
+    """
+    __slots__ = ("nodes", "tables", "shapes", "groups", "sides")
+
+    def __init__(self, nodes: list[Node]):
+        self.nodes = nodes
+        self.tables: dict[Callable[[Cat], Optional[type]],
+                          dict[type, list[int]]] = dict()
+        self.shapes: Optional[dict[tuple[type, RuleSymbol], int]] = None
+        self.groups: Optional[dict[Cat, list[Node]]] = None
+        self.sides: dict["Grammar", tuple[tuple[int, ...], tuple[int, ...]]] = dict()
+
+    def lookup(self, key: Callable[[Cat], Optional[type]]) -> dict[type, list[int]]:
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = dict()
+            for position, node in enumerate(self.nodes):
+                head = key(node.cat)
+                if head is not None:
+                    table.setdefault(head, []).append(position)
+        return table
+
+    def conjuncts(self) -> dict[Cat, list[Node]]:
+        """the nodes which can be the right conjunct of the coordination rule, grouped by the categories."""
+        if self.groups is None:
+            self.groups = dict()
+            for node in self.nodes:
+                if node.cat.endsWithT or node.cat.isNStem:
+                    self.groups.setdefault(node.cat, []).append(node)
+        return self.groups
+
+    def countShapes(self) -> dict[tuple[type, RuleSymbol], int]:
+        if self.shapes is None:
+            self.shapes = dict()
+            for node in self.nodes:
+                shape = (type(node.cat), node.rs)
+                self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        return self.shapes
+
+    def countSides(self, grammar: "Grammar") -> tuple[tuple[int, ...], tuple[int, ...]]:
+        """
+        the numbers of the nodes which satisfy the conditions on the left and on the right of each rule of `grammar`.
+        Since `selectBinaryRules` checks the two sides independently,
+        a rule is selected for the product of the two numbers of the pairs of nodes in two cells.
+        """
+        sides = self.sides.get(grammar)
+        if sides is None:
+            shapes = self.countShapes().items()
+            sides = self.sides[grammar] = (
+                tuple(sum(count for (shape, rs), count in shapes
+                          if (rule.left is None or rule.left is shape) and rs not in rule.bannedLeft)
+                      for rule in grammar.rules),
+                tuple(sum(count for (shape, rs), count in shapes
+                          if (rule.right is None or rule.right is shape) and rs not in rule.bannedRight)
+                      for rule in grammar.rules))
+        return sides
+
+
+def binaryRulesJoinInto(lindex: NodeIndex, rindex: NodeIndex, sink: list[Node]) -> None:
+    """`Grammar.binaryRulesJoinInto` by `defaultGrammar`."""
+    defaultGrammar.binaryRulesJoinInto(lindex, rindex, sink)
+
+
+def binaryNode(rs: RuleSymbol, lnode: Node, rnode: Node, newcat: Cat) -> Node:
+    return Node(
+        rs,
+        lnode.pf + rnode.pf,
+        newcat,
+        [lnode, rnode],
+        lnode.score * rnode.score,
+        "",
     )
 
 
 def forwardFunctionApplicationRule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Forward function application rule."""
-    if lnode.rs in [RuleSymbol.FFC1, RuleSymbol.FFC2, RuleSymbol.FFC3]:
+    if daughtersBanned(RuleSymbol.FFA, lnode, rnode):
+        return prevlist
+    newcat = unificationCache.apply(
+        RuleSymbol.FFA, forwardFunctionApplication, lnode.cat, rnode.cat)
+    if newcat is None:
         return prevlist
-    match lnode.cat:
+    return [binaryNode(RuleSymbol.FFA, lnode, rnode, newcat)] + prevlist
+
+
+def forwardFunctionApplication(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match lcat:
         case cat.SL(x, y1):
             match y1:
                 case cat.T(True, _, _):
-                    return prevlist
+                    return None
                 case _:
-                    inc = maximumIndexC(rnode.cat)
-                    result = unifyCategory(
-                        [], [], [], rnode.cat, incrementIndexC(y1, inc))
+                    inc = rcat.maximumIndex
+                    result = unificationMode.unify(
+                        Assignment(), Assignment(), [], rcat, 0, y1, inc)
                     if result is None:
-                        return prevlist
-                    else:
-                        _, csub, fsub = result
-                        newcat = simulSubstituteCV(
-                            csub, fsub, incrementIndexC(x, inc))
-                        return [Node(
-                            RuleSymbol.FFA,
-                            lnode.pf + rnode.pf,
-                            newcat,
-                            [lnode, rnode],
-                            lnode.score * rnode.score,
-                            "",
-                        )] + prevlist
-        case _: return prevlist
+                        return None
+                    _, csub, fsub = result
+                    return unificationMode.substitute(csub, fsub, x, inc)
+        case _: return None
 
 
 def backwardFunctionApplicationRule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Backward function application rule."""
-    if rnode.rs in [RuleSymbol.BFC1, RuleSymbol.BFC2, RuleSymbol.BFC3]:
+    if daughtersBanned(RuleSymbol.BFA, lnode, rnode):
+        return prevlist
+    newcat = unificationCache.apply(
+        RuleSymbol.BFA, backwardFunctionApplication, lnode.cat, rnode.cat)
+    if newcat is None:
         return prevlist
-    match rnode.cat:
+    return [binaryNode(RuleSymbol.BFA, lnode, rnode, newcat)] + prevlist
+
+
+def backwardFunctionApplication(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match rcat:
         case cat.BS(x, y2):
-            inc = maximumIndexC(lnode.cat)
-            result = unifyCategory(
-                [], [], [], lnode.cat, incrementIndexC(y2, inc))
+            inc = lcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], lcat, 0, y2, inc)
             if result is None:
-                return prevlist
-            else:
-                _, csub, fsub = result
-                newcat = simulSubstituteCV(
-                    csub, fsub, incrementIndexC(x, inc))
-                return [Node(
-                    RuleSymbol.BFA,
-                    lnode.pf + rnode.pf,
-                    newcat,
-                    [lnode, rnode],
-                    lnode.score * rnode.score,
-                    "",
-                )] + prevlist
-        case _: return prevlist
+                return None
+            _, csub, fsub = result
+            return unificationMode.substitute(csub, fsub, x, inc)
+        case _: return None
 
 
 def forwardFunctionComposition1Rule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Forward function composition rule."""
-    if lnode.rs in [RuleSymbol.FFC1, RuleSymbol.FFC2, RuleSymbol.FFC3]:
+    if daughtersBanned(RuleSymbol.FFC1, lnode, rnode):
+        return prevlist
+    newcat = unificationCache.apply(
+        RuleSymbol.FFC1, forwardFunctionComposition1, lnode.cat, rnode.cat)
+    if newcat is None:
         return prevlist
-    match (lnode.cat, rnode.cat):
+    return [binaryNode(RuleSymbol.FFC1, lnode, rnode, newcat)] + prevlist
+
+
+def forwardFunctionComposition1(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match (lcat, rcat):
         case (cat.SL(x, y1), cat.SL(y2, z)):
-            if isTNoncaseNP(y1):
-                return prevlist
-            inc = maximumIndexC(rnode.cat)
-            result = unifyCategory(
-                [], [], [], y2, incrementIndexC(y1, inc))
+            if y1.isTNoncaseNP:
+                return None
+            inc = rcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], y2, 0, y1, inc)
             if result is None:
-                return prevlist
+                return None
             (_, csub, fsub) = result
-            _z = simulSubstituteCV(csub, fsub, z)
-            if numberOfArguments(_z) > 3:
-                return prevlist
-            newcat = cat.SL(simulSubstituteCV(
-                csub, fsub, incrementIndexC(x, inc)), _z)
-            return [Node(
-                RuleSymbol.FFC1,
-                lnode.pf + rnode.pf,
-                newcat,
-                [lnode, rnode],
-                lnode.score * rnode.score,
-                "",
-            )] + prevlist
-        case _: return prevlist
+            _z = unificationMode.substitute(csub, fsub, z, 0)
+            if _z.numberOfArguments > 3:
+                return None
+            return cat.SL(unificationMode.substitute(csub, fsub, x, inc), _z)
+        case _: return None
 
 
 def backwardFunctionComposition1Rule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Backward function composition rule."""
-    if rnode.rs in [RuleSymbol.BFC1, RuleSymbol.BFC2, RuleSymbol.BFC3]:
+    if daughtersBanned(RuleSymbol.BFC1, lnode, rnode):
         return prevlist
-    match (lnode.cat, rnode.cat):
+    newcat = unificationCache.apply(
+        RuleSymbol.BFC1, backwardFunctionComposition1, lnode.cat, rnode.cat)
+    if newcat is None:
+        return prevlist
+    return [binaryNode(RuleSymbol.BFC1, lnode, rnode, newcat)] + prevlist
+
+
+def backwardFunctionComposition1(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match (lcat, rcat):
         case (cat.BS(y1, z), cat.BS(x, y2)):
-            inc = maximumIndexC(lnode.cat)
-            result = unifyCategory(
-                [], [], [], y1, incrementIndexC(y2, inc))
+            inc = lcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], y1, 0, y2, inc)
             if result is None:
-                return prevlist
+                return None
 
             (_, csub, fsub) = result
-            newcat = simulSubstituteCV(
-                csub, fsub, cat.BS(incrementIndexC(x, inc), z))
-            return [Node(
-                RuleSymbol.BFC1,
-                lnode.pf + rnode.pf,
-                newcat,
-                [lnode, rnode],
-                lnode.score * rnode.score,
-                "",
-            )] + prevlist
+            return cat.BS(unificationMode.substitute(csub, fsub, x, inc),
+                          unificationMode.substitute(csub, fsub, z, 0))
         case _:
-            return prevlist
+            return None
 
 
 def forwardFunctionComposition2Rule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Forward function composition rule 2."""
     # TODO: Test required.
-    if lnode.rs in [RuleSymbol.FFC1, RuleSymbol.FFC2, RuleSymbol.FFC3]:
+    if daughtersBanned(RuleSymbol.FFC2, lnode, rnode):
         return prevlist
-    match (lnode.cat, rnode.cat):
+    newcat = unificationCache.apply(
+        RuleSymbol.FFC2, forwardFunctionComposition2, lnode.cat, rnode.cat)
+    if newcat is None:
+        return prevlist
+    return [binaryNode(RuleSymbol.FFC2, lnode, rnode, newcat)] + prevlist
+
+
+def forwardFunctionComposition2(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match (lcat, rcat):
         case (cat.SL(x, y1), cat.SL(cat.SL(y2, z1), z2)):
-            if isTNoncaseNP(y1):
-                return prevlist
-            inc = maximumIndexC(rnode.cat)
-            result = unifyCategory(
-                [], [], [], incrementIndexC(y1, inc), y2)
+            if y1.isTNoncaseNP:
+                return None
+            inc = rcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], y1, inc, y2, 0)
             if result is None:
-                return prevlist
+                return None
             (_, csub, fsub) = result
-            _z1 = simulSubstituteCV(csub, fsub, z1)
-            if numberOfArguments(_z1) > 2:
-                return prevlist
-            newcat = simulSubstituteCV(
-                csub, fsub, cat.SL(cat.SL(incrementIndexC(x, inc), _z1), z2))
-            return [Node(
-                RuleSymbol.FFC2,
-                lnode.pf + rnode.pf,
-                newcat,
-                [lnode, rnode],
-                lnode.score * rnode.score,
-                "",
-            )] + prevlist
-        case _: return prevlist
+            _z1 = unificationMode.substitute(csub, fsub, z1, 0)
+            if _z1.numberOfArguments > 2:
+                return None
+            return cat.SL(cat.SL(unificationMode.substitute(csub, fsub, x, inc),
+                                 unificationMode.substitute(csub, fsub, _z1, 0)),
+                          unificationMode.substitute(csub, fsub, z2, 0))
+        case _: return None
 
 
 def backwardFunctionComposition2Rule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Backward function composition rule 2."""
     # TODO: Test required.
-    if rnode.rs in [RuleSymbol.BFC1, RuleSymbol.BFC2, RuleSymbol.BFC3]:
+    if daughtersBanned(RuleSymbol.BFC2, lnode, rnode):
+        return prevlist
+    newcat = unificationCache.apply(
+        RuleSymbol.BFC2, backwardFunctionComposition2, lnode.cat, rnode.cat)
+    if newcat is None:
         return prevlist
-    match (lnode.cat, rnode.cat):
+    return [binaryNode(RuleSymbol.BFC2, lnode, rnode, newcat)] + prevlist
+
+
+def backwardFunctionComposition2(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match (lcat, rcat):
         case (cat.BS(cat.BS(y1, z1), z2), cat.BS(x, y2)):
-            inc = maximumIndexC(lnode.cat)
-            result = unifyCategory(
-                [], [], [], incrementIndexC(y2, inc), y1)
+            inc = lcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], y2, inc, y1, 0)
             if result is None:
-                return prevlist
+                return None
             (_, csub, fsub) = result
-            newcat = simulSubstituteCV(
-                csub, fsub, cat.BS(cat.BS(incrementIndexC(x, inc), z1), z2))
-            return [Node(
-                RuleSymbol.BFC2,
-                lnode.pf + rnode.pf,
-                newcat,
-                [lnode, rnode],
-                lnode.score * rnode.score,
-                "",
-            )] + prevlist
-        case _: return prevlist
+            return cat.BS(cat.BS(unificationMode.substitute(csub, fsub, x, inc),
+                                 unificationMode.substitute(csub, fsub, z1, 0)),
+                          unificationMode.substitute(csub, fsub, z2, 0))
+        case _: return None
 
 
 def backwardFunctionComposition3Rule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Backward function composition rule 3."""
     # TODO: Test required.
-    if rnode.rs in [RuleSymbol.BFC1, RuleSymbol.BFC2, RuleSymbol.BFC3]:
+    if daughtersBanned(RuleSymbol.BFC3, lnode, rnode):
         return prevlist
-    match (lnode.cat, rnode.cat):
+    newcat = unificationCache.apply(
+        RuleSymbol.BFC3, backwardFunctionComposition3, lnode.cat, rnode.cat)
+    if newcat is None:
+        return prevlist
+    return [binaryNode(RuleSymbol.BFC3, lnode, rnode, newcat)] + prevlist
+
+
+def backwardFunctionComposition3(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match (lcat, rcat):
         case (cat.BS(cat.BS(cat.BS(y1, z1), z2), z3), cat.BS(x, y2)):
-            inc = maximumIndexC(lnode.cat)
-            result = unifyCategory(
-                [], [], [], incrementIndexC(y2, inc), y1)
+            inc = lcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], y2, inc, y1, 0)
             if result is None:
-                return prevlist
+                return None
             (_, csub, fsub) = result
-            newcat = simulSubstituteCV(
-                csub, fsub, cat.BS(cat.BS(cat.BS(incrementIndexC(x, inc), z1), z2), z3))
-            return [Node(
-                RuleSymbol.BFC3,
-                lnode.pf + rnode.pf,
-                newcat,
-                [lnode, rnode],
-                lnode.score * rnode.score,
-                "",
-            )] + prevlist
-        case _: return prevlist
+            return cat.BS(cat.BS(cat.BS(unificationMode.substitute(csub, fsub, x, inc),
+                                        unificationMode.substitute(csub, fsub, z1, 0)),
+                                 unificationMode.substitute(csub, fsub, z2, 0)),
+                          unificationMode.substitute(csub, fsub, z3, 0))
+        case _: return None
 
 
 def forwardFunctionCrossedComposition1Rule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Forward function crossed composition rule."""
     # TODO: Test required.
-    if rnode.rs in [RuleSymbol.FFC1, RuleSymbol.FFC2, RuleSymbol.FFC3]:
+    if daughtersBanned(RuleSymbol.FFCx1, lnode, rnode):
+        return prevlist
+    newcat = unificationCache.apply(
+        RuleSymbol.FFCx1, forwardFunctionCrossedComposition1, lnode.cat, rnode.cat)
+    if newcat is None:
         return prevlist
-    match (lnode.cat, rnode.cat):
+    return [binaryNode(RuleSymbol.FFCx1, lnode, rnode, newcat)] + prevlist
+
+
+def forwardFunctionCrossedComposition1(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match (lcat, rcat):
         case (cat.SL(x, y1), cat.BS(y2, z)):
-            if isTNoncaseNP(y1) or not isArgumentCategory(z):
-                return prevlist
-            inc = maximumIndexC(rnode.cat)
-            result = unifyCategory(
-                [], [], [], y2, incrementIndexC(y1, inc))
+            if y1.isTNoncaseNP or not z.isArgumentCategory:
+                return None
+            inc = rcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], y2, 0, y1, inc)
             if result is None:
-                return prevlist
+                return None
             (_, csub, fsub) = result
-            z_ = simulSubstituteCV(csub, fsub, z)
-            newcat = cat.BS(simulSubstituteCV(
-                csub, fsub, incrementIndexC(x, inc)), z_)
-            return [Node(
-                RuleSymbol.FFCx1,
-                lnode.pf + rnode.pf,
-                newcat,
-                [lnode, rnode],
-                lnode.score * rnode.score * 1,
-                "",
-            )] + prevlist
-        case _: return prevlist
+            z_ = unificationMode.substitute(csub, fsub, z, 0)
+            return cat.BS(unificationMode.substitute(csub, fsub, x, inc), z_)
+        case _: return None
 
 
 def forwardFunctionCrossedComposition2Rule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Forward function crossed composition rule 2."""
     # TODO: Test required.
-    if rnode.rs in [RuleSymbol.FFC1, RuleSymbol.FFC2, RuleSymbol.FFC3, RuleSymbol.EC]:
+    if daughtersBanned(RuleSymbol.FFCx2, lnode, rnode):
         return prevlist
-    match (lnode.cat, rnode.cat):
+    newcat = unificationCache.apply(
+        RuleSymbol.FFCx2, forwardFunctionCrossedComposition2, lnode.cat, rnode.cat)
+    if newcat is None:
+        return prevlist
+    return [binaryNode(RuleSymbol.FFCx2, lnode, rnode, newcat)] + prevlist
+
+
+def forwardFunctionCrossedComposition2(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match (lcat, rcat):
         case (cat.SL(x, y1), cat.BS(cat.BS(y2, z1), z2)):
-            if isTNoncaseNP(y1) or not isArgumentCategory(z2) or not isArgumentCategory(z1):
-                return prevlist
-            inc = maximumIndexC(rnode.cat)
-            result = unifyCategory(
-                [], [], [], incrementIndexC(y1, inc), y2)
+            if y1.isTNoncaseNP or not z2.isArgumentCategory or not z1.isArgumentCategory:
+                return None
+            inc = rcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], y1, inc, y2, 0)
             if result is None:
-                return prevlist
+                return None
             (_, csub, fsub) = result
-            z1_ = simulSubstituteCV(csub, fsub, z1)
-            if numberOfArguments(z1_) > 2:
-                return prevlist
-            newcat = simulSubstituteCV(
-                csub, fsub, cat.BS(cat.BS(incrementIndexC(x, inc), z1_), z2))
-            return [Node(
-                RuleSymbol.FFCx2,
-                lnode.pf + rnode.pf,
-                newcat,
-                [lnode, rnode],
-                lnode.score * rnode.score * 1,
-                "",
-            )] + prevlist
-        case _: return prevlist
+            z1_ = unificationMode.substitute(csub, fsub, z1, 0)
+            if z1_.numberOfArguments > 2:
+                return None
+            return cat.BS(cat.BS(unificationMode.substitute(csub, fsub, x, inc),
+                                 unificationMode.substitute(csub, fsub, z1_, 0)),
+                          unificationMode.substitute(csub, fsub, z2, 0))
+        case _: return None
 
 
 def forwardFunctionCrossedSubstitutionRule(lnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Forward function crossed substitution rule."""
     # TODO: Test required.
-    match (lnode.cat, rnode.cat):
+    if daughtersBanned(RuleSymbol.FFSx, lnode, rnode):
+        return prevlist
+    newcat = unificationCache.apply(
+        RuleSymbol.FFSx, forwardFunctionCrossedSubstitution, lnode.cat, rnode.cat)
+    if newcat is None:
+        return prevlist
+    return [binaryNode(RuleSymbol.FFSx, lnode, rnode, newcat)] + prevlist
+
+
+def forwardFunctionCrossedSubstitution(lcat: Cat, rcat: Cat) -> Optional[Cat]:
+    match (lcat, rcat):
         case (cat.BS(cat.SL(x, y1), z1), cat.BS(y2, z2)):
-            if not isArgumentCategory(z1) or not isArgumentCategory(z2):
-                return prevlist
-            inc = maximumIndexC(rnode.cat)
-            result = unifyCategory(
-                [], [], [], incrementIndexC(z1, inc), z2)
+            if not z1.isArgumentCategory or not z2.isArgumentCategory:
+                return None
+            inc = rcat.maximumIndex
+            result = unificationMode.unify(
+                Assignment(), Assignment(), [], z1, inc, z2, 0)
             if result is None:
-                return prevlist
+                return None
             (z, csub1, fsub1) = result
-            result = unifyCategory(
-                csub1, fsub1, [], incrementIndexC(y1, inc), y2)
+            result = unificationMode.unify(
+                csub1, fsub1, [], y1, inc, y2, 0)
             if result is None:
-                return prevlist
+                return None
             (_, csub2, fsub2) = result
-            newcat = simulSubstituteCV(
-                csub2, fsub2, cat.BS(incrementIndexC(x, inc), z))
-            return [Node(
-                RuleSymbol.FFSx,
-                lnode.pf + rnode.pf,
-                newcat,
-                [lnode, rnode],
-                lnode.score * rnode.score,
-                "",
-            )] + prevlist
-        case _: return prevlist
+            return cat.BS(unificationMode.substitute(csub2, fsub2, x, inc),
+                          unificationMode.substitute(csub2, fsub2, z, 0))
+        case _: return None
+
+
+def headOf(c: Cat) -> Optional[type]:
+    return c.head
+
+
+def argumentHeadOf(c: Cat) -> Optional[type]:
+    match c:
+        case cat.SL(_, y) | cat.BS(_, y):
+            return y.head
+        case _:
+            return None
+
+
+@dataclass(frozen=True)
+class BinaryRule:
+    """
+    The conditions for a binary rule to be applicable, which are checked without looking into the categories,
+    and the keys of the categories which must be the same for the rule to succeed.
+    """
+    symbol: RuleSymbol
+    function: Callable[[Cat, Cat], Optional[Cat]]
+    left: Optional[type]
+    """the class of the left category (None if any category is possible)"""
+    right: Optional[type]
+    """the class of the right category (None if any category is possible)"""
+    bannedLeft: frozenset[RuleSymbol] = frozenset()
+    """the rules which must not derive the left node"""
+    bannedRight: frozenset[RuleSymbol] = frozenset()
+    """the rules which must not derive the right node"""
+    leftKey: Callable[[Cat], Optional[type]] = headOf
+    """the head of the part of the left category which the rule unifies first (None if there is no such part)"""
+    rightKey: Callable[[Cat], Optional[type]] = headOf
+    """the head of the part of the right category which the rule unifies first (None if there is no such part)"""
+
+
+forwardCompositions = frozenset(
+    [RuleSymbol.FFC1, RuleSymbol.FFC2, RuleSymbol.FFC3])
+backwardCompositions = frozenset(
+    [RuleSymbol.BFC1, RuleSymbol.BFC2, RuleSymbol.BFC3])
+
+"""
+The binary rules in the order of application: each rule adds its result in front of the previous results.
+The `xxxRule` functions check the banned rules of this list (see `daughtersBanned`),
+and the classes of the categories must agree with the patterns of the rule functions.
+"""
+binaryRuleList: list[BinaryRule] = [
+    BinaryRule(RuleSymbol.FFA, forwardFunctionApplication,
+               cat.SL, None, bannedLeft=forwardCompositions, leftKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.BFA, backwardFunctionApplication,
+               None, cat.BS, bannedRight=backwardCompositions, rightKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.FFC1, forwardFunctionComposition1,
+               cat.SL, cat.SL, bannedLeft=forwardCompositions, leftKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.BFC1, backwardFunctionComposition1,
+               cat.BS, cat.BS, bannedRight=backwardCompositions, rightKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.FFC2, forwardFunctionComposition2,
+               cat.SL, cat.SL, bannedLeft=forwardCompositions, leftKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.BFC2, backwardFunctionComposition2,
+               cat.BS, cat.BS, bannedRight=backwardCompositions, rightKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.BFC3, backwardFunctionComposition3,
+               cat.BS, cat.BS, bannedRight=backwardCompositions, rightKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.FFCx1, forwardFunctionCrossedComposition1,
+               cat.SL, cat.BS, bannedRight=forwardCompositions, leftKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.FFCx2, forwardFunctionCrossedComposition2,
+               cat.SL, cat.BS, bannedRight=forwardCompositions | {RuleSymbol.EC}, leftKey=argumentHeadOf),
+    BinaryRule(RuleSymbol.FFSx, forwardFunctionCrossedSubstitution,
+               cat.BS, cat.BS, leftKey=argumentHeadOf, rightKey=argumentHeadOf),
+]
+
+"""
+The rule symbols which must not derive each daughter of a node derived by each rule:
+the conditions of the binary rules, and the left conjunct of the coordination rule.
+"""
+bannedDaughters: dict[RuleSymbol, tuple[frozenset[RuleSymbol], ...]] = {
+    rule.symbol: (rule.bannedLeft, rule.bannedRight) for rule in binaryRuleList}
+bannedDaughters[RuleSymbol.COORD] = (
+    frozenset([RuleSymbol.COORD]), frozenset(), frozenset())
+
+
+def guardClassOf(rs: RuleSymbol) -> frozenset[tuple[RuleSymbol, int]]:
+    """the pairs of a rule and the position of a daughter which a node derived by `rs` cannot be."""
+    return frozenset((symbol, position) for symbol, banned in bannedDaughters.items()
+                     for position, symbols in enumerate(banned) if rs in symbols)
+
+
+"""
+The guard class of each rule symbol. The nodes derived by the rules of the same class can take part in the same rules.
+"""
+guardClasses: dict[RuleSymbol, frozenset[tuple[RuleSymbol, int]]] = {
+    rs: guardClassOf(rs) for rs in RuleSymbol}
+
+
+def daughtersBanned(rs: RuleSymbol, lnode: Node, rnode: Node) -> bool:
+    """whether the binary rule `rs` bans the rule symbol of either daughter (see `BinaryRule`)."""
+    bannedLeft, bannedRight = bannedDaughters[rs]
+    return lnode.rs in bannedLeft or rnode.rs in bannedRight
+
+ruleMasks: dict[RuleSymbol, int] = {
+    rule.symbol: 1 << n for n, rule in enumerate(binaryRuleList)}
+
+
+def joinsOfBinaryRules(rules: list[BinaryRule] = binaryRuleList) -> list[tuple[Callable[[Cat], Optional[type]], Callable[[Cat], Optional[type]], int]]:
+    """groups the rules by their keys, with the mask of the rules in each group."""
+    joins: dict[tuple[Callable[[Cat], Optional[type]], Callable[[Cat], Optional[type]]], int] = dict()
+    for rule in rules:
+        keys = (rule.leftKey, rule.rightKey)
+        joins[keys] = joins.get(keys, 0) | ruleMasks[rule.symbol]
+    return [(leftKey, rightKey, mask) for (leftKey, rightKey), mask in joins.items()]
+
+
+class CompiledEmptyCategory:
+    """
+    An empty category compiled into the patterns of the categories it can combine with.
+    For each key of the binary rules, `asLeft` maps the head which the key of the other (right) category must have
+    to the mask of the rules (see `ruleMasks`) which can combine the empty category on the left, and `asRight` likewise.
+    The rules for the other node depend only on the class of its category, the heads of its keys and its rule symbol,
+    and are found once for each of them and memoized in `rules`, which holds no categories.
+    The empty category is compiled for the rules of `grammar` (`defaultGrammar` by default).
+    """
+    __slots__ = ("node", "grammar", "keys", "asLeft", "asRight", "rules")
+
+    def __init__(self, node: Node, grammar: Optional["Grammar"] = None):
+        self.node = node
+        self.grammar = defaultGrammar if grammar is None else grammar
+        self.asLeft: dict[Callable[[Cat], Optional[type]], dict[type, int]] = dict()
+        self.asRight: dict[Callable[[Cat], Optional[type]], dict[type, int]] = dict()
+        for rule in self.grammar.rules:
+            head = rule.leftKey(node.cat)
+            if head is not None:
+                table = self.asLeft.setdefault(rule.rightKey, dict())
+                table[head] = table.get(head, 0) | ruleMasks[rule.symbol]
+            head = rule.rightKey(node.cat)
+            if head is not None:
+                table = self.asRight.setdefault(rule.leftKey, dict())
+                table[head] = table.get(head, 0) | ruleMasks[rule.symbol]
+        self.keys = tuple(dict.fromkeys(
+            key for rule in self.grammar.rules for key in (rule.leftKey, rule.rightKey)))
+        """the keys of the rules"""
+        self.rules: dict[tuple[type, RuleSymbol, tuple[Optional[type], ...]],
+                         tuple[tuple[BinaryRule, ...], tuple[BinaryRule, ...], tuple[RuleSymbol, ...]]] = dict()
+
+    def rulesFor(self, node: Node) -> tuple[tuple[BinaryRule, ...], tuple[BinaryRule, ...], tuple[RuleSymbol, ...]]:
+        """
+        returns the rules to apply with the empty category on the left and on the right of `node`,
+        and the rules selected by `binaryRuleDispatch` but avoided by the patterns.
+        """
+        shape = (type(node.cat), node.rs, tuple(key(node.cat) for key in self.keys))
+        rules = self.rules.get(shape)
+        if rules is None:
+            leftMask = self.match(self.asLeft, node.cat)
+            rightMask = self.match(self.asRight, node.cat)
+            left, right, avoided = [], [], []
+            for rule in self.grammar.dispatchBinaryRules(self.node, node):
+                (left if leftMask & ruleMasks[rule.symbol] else avoided).append(rule)
+            for rule in self.grammar.dispatchBinaryRules(node, self.node):
+                (right if rightMask & ruleMasks[rule.symbol] else avoided).append(rule)
+            rules = self.rules[shape] = (
+                tuple(left), tuple(right), tuple(rule.symbol for rule in avoided))
+        return rules
+
+    @staticmethod
+    def match(patterns: dict[Callable[[Cat], Optional[type]], dict[type, int]], c: Cat) -> int:
+        mask = 0
+        for key, table in patterns.items():
+            head = key(c)
+            if head is not None:
+                mask |= table.get(head, 0)
+        return mask
+
+
+def emptyCategoryRulesInto(ec: CompiledEmptyCategory, node: Node, sink: list[Node]) -> None:
+    """`Grammar.emptyCategoryRulesInto` by the grammar of `ec`."""
+    ec.grammar.emptyCategoryRulesInto(ec, node, sink)
+
+
+def selectBinaryRules(lshape: type, rshape: type, lrs: RuleSymbol, rrs: RuleSymbol,
+                      rules: Iterable[BinaryRule] = binaryRuleList) -> tuple[BinaryRule, ...]:
+    """selects the rules which can be applied to categories of the given classes derived by the given rules."""
+    return tuple(rule for rule in rules
+                 if (rule.left is None or rule.left is lshape)
+                 and (rule.right is None or rule.right is rshape)
+                 and lrs not in rule.bannedLeft and rrs not in rule.bannedRight)
+
+
+"""
+(the class of the left category, the class of the right category, the rule of the left node, the rule of the right node)
+"""
+DispatchKey = tuple[type, type, RuleSymbol, RuleSymbol]
+
+
+def selectBinaryRulesCached(lshape: type, rshape: type, lrs: RuleSymbol, rrs: RuleSymbol) -> tuple[BinaryRule, ...]:
+    return defaultGrammar.selectBinaryRulesCached(lshape, rshape, lrs, rrs)
+
+
+def dispatchBinaryRules(lnode: Node, rnode: Node) -> tuple[BinaryRule, ...]:
+    return defaultGrammar.dispatchBinaryRules(lnode, rnode)
+
+
+class RuleCounters:
+    """Counts how many times each binary rule derives a category (fired) or fails (rejected)."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.pairs = 0
+        """the number of the pairs of nodes given to `binaryRules`"""
+        self.fired: dict[RuleSymbol, int] = {
+            rule.symbol: 0 for rule in binaryRuleList}
+        self.rejected: dict[RuleSymbol, int] = {
+            rule.symbol: 0 for rule in binaryRuleList}
+        self.avoided: dict[RuleSymbol, int] = {
+            rule.symbol: 0 for rule in binaryRuleList}
+        """the number of the applications skipped by `binaryRulesJoinInto` because the keys do not have the same head"""
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """
+        returns the counts for each rule, including the number of the pairs for which the rule was not tried at all
+        (which includes the avoided ones).
+        """
+        return {rs.name: {"fired": self.fired[rs],
+                          "rejected": self.rejected[rs],
+                          "skipped": self.pairs - self.fired[rs] - self.rejected[rs],
+                          "avoided": self.avoided[rs]}
+                for rs in self.fired}
+
+
+ruleCounters = RuleCounters()
+
+
+class Grammar:
+    """
+    A set of the binary rules, with the unification cache and the counters they are applied with.
+    The dispatch table (see `selectBinaryRules`) and the joins (see `binaryRulesJoinInto`) are for the rules in the set.
+    A grammar is not shared between threads, since applying the rules updates the cache and the counters.
+    The unification mode (see `setUnificationMode`) is common to all the grammars,
+    and changing it discards the results in the caches of all of them.
+    """
+
+    def __init__(self, rules: Iterable[BinaryRule] = binaryRuleList, cache: Optional[UnificationCache] = None,
+                 counters: Optional[RuleCounters] = None):
+        self.rules: tuple[BinaryRule, ...] = tuple(rules)
+        """the rules in the order of `binaryRuleList`"""
+        self.cache = UnificationCache() if cache is None else cache
+        self.counters = RuleCounters() if counters is None else counters
+        self.generation = unificationModeGeneration
+        """the value of `unificationModeGeneration` for the results in the cache"""
+        self.joins = joinsOfBinaryRules(list(self.rules))
+        self.dispatch: dict[DispatchKey, tuple[BinaryRule, ...]] = dict()
+
+    def selectBinaryRulesCached(self, lshape: type, rshape: type, lrs: RuleSymbol, rrs: RuleSymbol) -> tuple[BinaryRule, ...]:
+        key = (lshape, rshape, lrs, rrs)
+        rules = self.dispatch.get(key)
+        if rules is None:
+            rules = self.dispatch[key] = selectBinaryRules(*key, self.rules)
+        return rules
+
+    def dispatchBinaryRules(self, lnode: Node, rnode: Node) -> tuple[BinaryRule, ...]:
+        return self.selectBinaryRulesCached(type(lnode.cat), type(rnode.cat), lnode.rs, rnode.rs)
+
+    def binaryRulesInto(self, lnode: Node, rnode: Node, sink: list[Node]) -> None:
+        """
+        adds the nodes derived from a pair of CCG nodes by the binary rules to `sink`.
+        Only the rules selected by `selectBinaryRules` for the shapes of the categories
+        and the rule symbols of the nodes are applied.
+        """
+        self.counters.pairs += 1
+        for rule in self.dispatchBinaryRules(lnode, rnode):
+            self.applyBinaryRuleInto(rule, lnode, rnode, sink)
+
+    def applyBinaryRuleInto(self, rule: BinaryRule, lnode: Node, rnode: Node, sink: list[Node]) -> None:
+        if self.generation != unificationModeGeneration:
+            # 別の単一化の方式による結果は変数の番号が異なるので捨てる
+            self.cache.clear()
+            self.generation = unificationModeGeneration
+        newcat = self.cache.apply(
+            rule.symbol, rule.function, lnode.cat, rnode.cat)
+        if newcat is None:
+            self.counters.rejected[rule.symbol] += 1
+        else:
+            self.counters.fired[rule.symbol] += 1
+            sink.append(binaryNode(rule.symbol, lnode, rnode, newcat))
+
+    def binaryRulesJoinInto(self, lindex: NodeIndex, rindex: NodeIndex, sink: list[Node]) -> None:
+        """
+        `binaryRulesInto` for all the pairs of the nodes in two cells, in the same order as the nested loop over them.
+        The rules are tried only on the pairs whose keys have the same head,
+        which are found by joining the tables of the indices instead of looking at every pair.
+        """
+        lnodes, rnodes = lindex.nodes, rindex.nodes
+        self.counters.pairs += len(lnodes) * len(rnodes)
+        candidates: dict[tuple[int, int], int] = dict()
+        for leftKey, rightKey, mask in self.joins:
+            ltable = lindex.lookup(leftKey)
+            rtable = rindex.lookup(rightKey)
+            for head, lpositions in ltable.items():
+                rpositions = rtable.get(head)
+                if rpositions is None:
+                    continue
+                for a in lpositions:
+                    for b in rpositions:
+                        candidates[(a, b)] = candidates.get((a, b), 0) | mask
+        tried = dict.fromkeys(ruleMasks, 0)
+        for a, b in sorted(candidates):
+            mask = candidates[(a, b)]
+            lnode, rnode = lnodes[a], rnodes[b]
+            for rule in self.dispatchBinaryRules(lnode, rnode):
+                if mask & ruleMasks[rule.symbol]:
+                    tried[rule.symbol] += 1
+                    self.applyBinaryRuleInto(rule, lnode, rnode, sink)
+        # 索引がなければ試していた規則の適用の数から、実際に試した数を引く
+        lcounts, _ = lindex.countSides(self)
+        _, rcounts = rindex.countSides(self)
+        for rule, lcount, rcount in zip(self.rules, lcounts, rcounts):
+            self.counters.avoided[rule.symbol] += lcount * rcount - tried[rule.symbol]
+
+    def emptyCategoryRulesInto(self, ec: CompiledEmptyCategory, node: Node, sink: list[Node]) -> None:
+        """
+        `binaryRulesInto(ec.node, node, sink)` followed by `binaryRulesInto(node, ec.node, sink)`,
+        trying only the rules whose patterns match `node`.
+        The empty category must be compiled for this grammar.
+        """
+        left, right, avoided = ec.rulesFor(node)
+        self.counters.pairs += 2
+        for symbol in avoided:
+            self.counters.avoided[symbol] += 1
+        for rule in left:
+            self.applyBinaryRuleInto(rule, ec.node, node, sink)
+        for rule in right:
+            self.applyBinaryRuleInto(rule, node, ec.node, sink)
+
+
+"""
+The grammar of all the binary rules with the module-level cache and counters, used by the functions of this module.
+"""
+defaultGrammar = Grammar(binaryRuleList, unificationCache, ruleCounters)
+binaryRuleDispatch = defaultGrammar.dispatch
+binaryRuleJoins = defaultGrammar.joins
 
 
 def coordinationRule(lnode: Node, cnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Coordination rule."""
+    sink: list[Node] = []
+    coordinationRuleInto(lnode, cnode, rnode, sink)
+    return sink[::-1] + prevlist
+
+
+def coordinationRuleInto(lnode: Node, cnode: Node, rnode: Node, sink: list[Node]) -> None:
     # TODO: Test required.
     if lnode.rs == RuleSymbol.COORD:
-        return prevlist
-    if (endsWithT(rnode.cat) or isNStem(rnode.cat)) and lnode.cat == rnode.cat:
-        return [Node(
-            RuleSymbol.COORD,
-            lnode.pf + cnode.pf + rnode.pf,
-            rnode.cat,
-            [lnode, cnode, rnode],
-            lnode.score * rnode.score,
-            "",
-        )] + prevlist
-    return prevlist
+        return
+    if (rnode.cat.endsWithT or rnode.cat.isNStem) and lnode.cat == rnode.cat:
+        sink.append(coordinationNode(lnode, cnode, rnode))
+
+
+def coordinationNode(lnode: Node, cnode: Node, rnode: Node) -> Node:
+    return Node(
+        RuleSymbol.COORD,
+        lnode.pf + cnode.pf + rnode.pf,
+        rnode.cat,
+        [lnode, cnode, rnode],
+        lnode.score * rnode.score,
+        "",
+    )
+
+
+def coordinationRuleJoinInto(lindex: NodeIndex, cnode: Node, rindex: NodeIndex, sink: list[Node]) -> None:
+    """
+    `coordinationRuleInto` for all the pairs of the nodes in two cells, in the same order as the nested loop over them.
+    Since the categories of the conjuncts must be the same, the right nodes which can be conjuncts are grouped by the categories,
+    and each left node is paired only with the group of its category.
+    """
+    groups = rindex.conjuncts()
+    if not groups:
+        return
+    for lnode in lindex.nodes:
+        if lnode.rs == RuleSymbol.COORD:
+            continue
+        for rnode in groups.get(lnode.cat, ()):
+            sink.append(coordinationNode(lnode, cnode, rnode))
 
 
 def parenthesisRule(lnode: Node, cnode: Node, rnode: Node, prevlist: list[Node]) -> list[Node]:
     """Parenthesis rule."""
+    sink: list[Node] = []
+    parenthesisRuleInto(lnode, cnode, rnode, sink)
+    return sink[::-1] + prevlist
+
+
+def parenthesisRuleInto(lnode: Node, cnode: Node, rnode: Node, sink: list[Node]) -> None:
     if lnode.cat == cat.LPAREN and rnode.cat == cat.RPAREN:
-        return [Node(
+        sink.append(Node(
             RuleSymbol.PAREN,
             lnode.pf + cnode.pf + rnode.pf,
             cnode.cat,
             [lnode, cnode, rnode],
             cnode.score,
             "",
-        )] + prevlist
-    return prevlist
+        ))
 
 
 def numberOfArguments(c: Cat) -> int:
-    match c:
-        case cat.SL(c1, _):
-            return 1 + numberOfArguments(c1)
-        case cat.BS(c1, _):
-            return 1 + numberOfArguments(c1)
-        case _: return 0
+    return c.numberOfArguments
 
 
 def maximumIndexC(c: Cat) -> int:
-    match c:
-        case cat.T(_, i, c2):
-            return max(i, maximumIndexC(c2))
-        case cat.SL(c1, c2):
-            return max(maximumIndexC(c1), maximumIndexC(c2))
-        case cat.BS(c1, c2):
-            return max(maximumIndexC(c1), maximumIndexC(c2))
-        case cat.S(f):
-            return maximumIndexF(f)
-        case cat.NP(f):
-            return maximumIndexF(f)
-        case cat.Sbar(f):
-            return maximumIndexF(f)
-        case _: return 0
+    return c.maximumIndex
 
 
 def maximumIndexF(fs: list[Feature]) -> int:
@@ -544,39 +934,37 @@ def incrementIndexF(fs: list[Feature], i: int) -> list[Feature]:
     return results
 
 
-def alter(i: int, v: int, mp: list[tuple[int, int]]) -> list[tuple[int, int]]:
-    return [(i, v)] + list(filter(lambda pair: i != pair[0], mp))
+T1 = TypeVar("T1")
 
 
-T1 = TypeVar("T1")
+def alter(i: int, v: SubstData[T1], mp: Assignment[T1]) -> Assignment[T1]:
+    return mp.bind(i, v)
 
 
-def fetchValue(sub: Assignment[T1], i: int, v: int) -> tuple[int, T1]:
-    result = list(filter(lambda pair: i == pair[0], sub))
-    if not result:
-        return (i, v)
-    assert len(result) == 1
-    _, data = result[0]
-    match data:
-        case SubstLink(j):
-            if j < i:
-                return fetchValue(sub, j, v)
-            else:
-                return (i, v)
-        # SubstVal[T1]の場合の処理
-        case SubstVal(v2):
-            return (i, v2)
-        case _: raise Exception("Unknown substitution.")
+def fetchValue(sub: Assignment[T1], i: int, v: T1) -> tuple[int, T1]:
+    return sub.fetch(i, v)
 
 
-def simulSubstituteCV(csub: Assignment[Cat], fsub: Assignment[list[FV]], c: Cat) -> Cat:
+def simulSubstituteCV(csub: Assignment[Cat], fsub: Assignment[FeatureSet], c: Cat) -> Cat:
+    """
+    applies the substitutions to a category.
+    The subtrees which have no index bound in the substitutions are returned as they are.
+    """
+    if not (csub.bindings or fsub.bindings):
+        return c
+    if c.categoryIndices.isdisjoint(csub.bindings) and c.featureIndices.isdisjoint(fsub.bindings):
+        return c
     match c:
         case cat.T(_, i, _):
             return fetchValue(csub, i, c)[1]
         case cat.SL(ca, cb):
-            return cat.SL(simulSubstituteCV(csub, fsub, ca), simulSubstituteCV(csub, fsub, cb))
+            ca2 = simulSubstituteCV(csub, fsub, ca)
+            cb2 = simulSubstituteCV(csub, fsub, cb)
+            return c if ca2 is ca and cb2 is cb else cat.SL(ca2, cb2)
         case cat.BS(ca, cb):
-            return cat.BS(simulSubstituteCV(csub, fsub, ca), simulSubstituteCV(csub, fsub, cb))
+            ca2 = simulSubstituteCV(csub, fsub, ca)
+            cb2 = simulSubstituteCV(csub, fsub, cb)
+            return c if ca2 is ca and cb2 is cb else cat.BS(ca2, cb2)
         case cat.S(f):
             return cat.S(simulSubstituteFV(fsub, f))
         case cat.Sbar(f):
@@ -586,7 +974,7 @@ def simulSubstituteCV(csub: Assignment[Cat], fsub: Assignment[list[FV]], c: Cat)
         case _: return c
 
 
-def unifyCategory(csub: Assignment[Cat], fsub: Assignment[list[FV]], banned: list[int], c1: Cat, c2: Cat) -> Optional[tuple[Cat, Assignment[Cat], Assignment[list[FV]]]]:
+def unifyCategory(csub: Assignment[Cat], fsub: Assignment[FeatureSet], banned: list[int], c1: Cat, c2: Cat) -> Optional[tuple[Cat, Assignment[Cat], Assignment[FeatureSet]]]:
     """"""
     match c1:
         case cat.T(_, i, _):
@@ -600,7 +988,7 @@ def unifyCategory(csub: Assignment[Cat], fsub: Assignment[list[FV]], banned: lis
     return unifyCategory2(csub, fsub, banned, c1, c2)
 
 
-def unifyCategory2(csub: Assignment[Cat], fsub: Assignment[list[FV]], banned: list[int], c1: Cat, c2: Cat) -> Optional[tuple[Cat, Assignment[Cat], Assignment[list[FV]]]]:
+def unifyCategory2(csub: Assignment[Cat], fsub: Assignment[FeatureSet], banned: list[int], c1: Cat, c2: Cat) -> Optional[tuple[Cat, Assignment[Cat], Assignment[FeatureSet]]]:
     match (c1, c2):
         case (cat.T(f1, i, u1), cat.T(f2, j, u2)):
             if i in banned or j in banned:
@@ -702,7 +1090,7 @@ def unifyCategory2(csub: Assignment[Cat], fsub: Assignment[list[FV]], banned: li
             return None
 
 
-def unifyWithHead(csub: Assignment[Cat], fsub: Assignment[list[FV]], banned: list[int], c1: Cat, c2: Cat) -> Optional[tuple[Cat, Assignment[Cat], Assignment[list[FV]]]]:
+def unifyWithHead(csub: Assignment[Cat], fsub: Assignment[FeatureSet], banned: list[int], c1: Cat, c2: Cat) -> Optional[tuple[Cat, Assignment[Cat], Assignment[FeatureSet]]]:
     """
     unifies a cyntactic category `c1` (in `T True i c1`) with the head of `c2`, under a given feature assignment.
     """
@@ -730,7 +1118,7 @@ def unifyWithHead(csub: Assignment[Cat], fsub: Assignment[list[FV]], banned: lis
         case _: return unifyCategory(csub, fsub, banned, c1, c2)
 
 
-def substituteFV(fsub: Assignment[list[FV]], f1: Feature) -> Feature:
+def substituteFV(fsub: Assignment[FeatureSet], f1: Feature) -> Feature:
     match f1:
         case feature.SF(i, v):
             j, v2 = fetchValue(fsub, i, v)
@@ -739,25 +1127,27 @@ def substituteFV(fsub: Assignment[list[FV]], f1: Feature) -> Feature:
         case _: raise Exception("unrecognized feature")
 
 
-def simulSubstituteFV(fsub: Assignment[list[FV]], fs: list[Feature]) -> list[Feature]:
-    return list(map(lambda f: substituteFV(fsub, f), fs))
+def simulSubstituteFV(fsub: Assignment[FeatureSet], fs: list[Feature]) -> list[Feature]:
+    bindings = fsub.bindings
+    return [substituteFV(fsub, f) if isinstance(f, feature.SF) and f.index in bindings else f
+            for f in fs]
 
 
-def unifyFeature(fsub: Assignment[list[FV]], f1: Feature, f2: Feature) -> Optional[tuple[Feature, Assignment[list[FV]]]]:
+def unifyFeature(fsub: Assignment[FeatureSet], f1: Feature, f2: Feature) -> Optional[tuple[Feature, Assignment[FeatureSet]]]:
     match (f1, f2):
         case (feature.SF(i, v1), feature.SF(j, v2)):
             if i == j:
                 i2, v1_2 = fetchValue(fsub, i, v1)
-                v3 = list(set(v1_2).intersection(v2))
-                if len(v3) == 0:
+                v3 = v1_2 & v2
+                if v3 == 0:
                     return None
                 else:
                     return (feature.SF(i2, v3), alter(i2, SubstVal(v3), fsub))
             else:
                 i2, v1_2 = fetchValue(fsub, i, v1)
                 j2, v2_2 = fetchValue(fsub, j, v2)
-                v3 = list(set(v1_2).intersection(v2_2))
-                if len(v3) == 0:
+                v3 = v1_2 & v2_2
+                if v3 == 0:
                     return None
                 else:
                     ijmax = max(i2, j2)
@@ -765,28 +1155,28 @@ def unifyFeature(fsub: Assignment[list[FV]], f1: Feature, f2: Feature) -> Option
                     return (feature.SF(ijmin, v3), alter(ijmax, SubstLink(ijmin), alter(ijmin, SubstVal(v3), fsub)))
         case (feature.SF(i, v1), feature.F(v2)):
             i2, v1_2 = fetchValue(fsub, i, v1)
-            v3 = list(set(v1_2).intersection(v2))
-            if len(v3) == 0:
+            v3 = v1_2 & v2
+            if v3 == 0:
                 return None
             else:
                 return (feature.SF(i2, v3), alter(i2, SubstVal(v3), fsub))
         case (feature.F(v1), feature.SF(j, v2)):
             j2, v2_2 = fetchValue(fsub, j, v2)
-            v3 = list(set(v1).intersection(v2_2))
-            if len(v3) == 0:
+            v3 = v1 & v2_2
+            if v3 == 0:
                 return None
             else:
                 return (feature.SF(j2, v3), alter(j2, SubstVal(v3), fsub))
         case (feature.F(v1), feature.F(v2)):
-            v3 = list(set(v1).intersection(v2))
-            if len(v3) == 0:
+            v3 = v1 & v2
+            if v3 == 0:
                 return None
             else:
                 return (feature.F(v3), fsub)
         case _: raise Exception(f"unrecognized case {f1} {f2}")
 
 
-def unifyFeatures(fsub: Assignment[list[FV]], f1: list[Feature], f2: list[Feature]) -> Optional[tuple[list[Feature], Assignment[list[FV]]]]:
+def unifyFeatures(fsub: Assignment[FeatureSet], f1: list[Feature], f2: list[Feature]) -> Optional[tuple[list[Feature], Assignment[FeatureSet]]]:
     match (f1, f2):
         case ([], []):
             return ([], fsub)
@@ -803,6 +1193,321 @@ def unifyFeatures(fsub: Assignment[list[FV]], f1: list[Feature], f2: list[Featur
         case _: return None
 
 
+"""
+Namespaced unification.
+
+In a rule application, the category variables and the shared features of the two daughters must be kept apart.
+Instead of renumbering a daughter with `incrementIndexC` before unification,
+a category is given together with the offset of its namespace,
+and the variable `i` in a category with the offset `s` is the variable `i + s` in the assignments.
+The offset of a daughter is the largest index in the other one, so that the namespaces do not overlap
+(the indices in the lexicon start from 1).
+Only the categories built as results are renumbered, and the subtrees without variables are shared.
+"""
+
+
+def renumberC(c: Cat, s: int) -> Cat:
+    """`incrementIndexC` which returns the subtrees without variables as they are."""
+    if s == 0 or c.maximumIndex == 0:
+        return c
+    match c:
+        case cat.T(f, j, u):
+            return cat.T(f, s+j, renumberC(u, s))
+        case cat.SL(c1, c2):
+            return cat.SL(renumberC(c1, s), renumberC(c2, s))
+        case cat.BS(c1, c2):
+            return cat.BS(renumberC(c1, s), renumberC(c2, s))
+        case cat.S(f):
+            return cat.S(incrementIndexF(f, s))
+        case cat.Sbar(f):
+            return cat.Sbar(incrementIndexF(f, s))
+        case cat.NP(f):
+            return cat.NP(incrementIndexF(f, s))
+        case _: return c
+
+
+def fetchCategoryNS(csub: Assignment[Cat], c: Cat, s: int) -> tuple[Cat, int]:
+    match c:
+        case cat.T(_, i, _):
+            _, v = csub.fetch(i + s, None)
+            # 代入された範疇は結果の番号付けになっている
+            return (c, s) if v is None else (v, 0)
+        case _:
+            return (c, s)
+
+
+def unifyCategoryNS(csub: Assignment[Cat], fsub: Assignment[FeatureSet], banned: list[int], c1: Cat, s1: int, c2: Cat, s2: int) -> Optional[tuple[Cat, Assignment[Cat], Assignment[FeatureSet]]]:
+    """`unifyCategory` of `c1` and `c2` in the namespaces with the offsets `s1` and `s2`."""
+    c1, s1 = fetchCategoryNS(csub, c1, s1)
+    c2, s2 = fetchCategoryNS(csub, c2, s2)
+    return unifyCategory2NS(csub, fsub, banned, c1, s1, c2, s2)
+
+
+def unifyCategory2NS(csub: Assignment[Cat], fsub: Assignment[FeatureSet], banned: list[int], c1: Cat, s1: int, c2: Cat, s2: int) -> Optional[tuple[Cat, Assignment[Cat], Assignment[FeatureSet]]]:
+    match (c1, c2):
+        case (cat.T(f1, i, u1), cat.T(f2, j, u2)):
+            i += s1
+            j += s2
+            if i in banned or j in banned:
+                return None
+            if i == j:
+                return (renumberC(c1, s1), csub, fsub)
+            ijmax = max(i, j)
+            ijmin = min(i, j)
+            match (f1, f2):
+                case (True, False):
+                    res = unifyWithHeadNS(
+                        csub, fsub, [ijmin]+banned, u1, s1, u2, s2)
+                case (False, True):
+                    res = unifyWithHeadNS(
+                        csub, fsub, [ijmin]+banned, u2, s2, u1, s1)
+                case _:
+                    res = unifyCategory2NS(
+                        csub, fsub, [ijmin]+banned, u1, s1, u2, s2)
+            if res is None:
+                return None
+            (u3, csub2, fsub2) = res
+            result = cat.T(f1 and f2, ijmin, u3)
+            return (result, alter(ijmin, SubstVal(result), alter(ijmax, SubstLink(ijmin), csub2)), fsub2)
+        case (cat.T(f, i, u), _):
+            i += s1
+            if i in banned:
+                return None
+            res = unifyWithHeadNS(csub, fsub, [i]+banned, u, s1, c2, s2
+                                  ) if f else unifyCategoryNS(csub, fsub, [i]+banned, u, s1, c2, s2)
+            if res is None:
+                return None
+            (c3, csub2, fsub2) = res
+            return (c3, alter(i, SubstVal(c3), csub2), fsub2)
+        case (_, cat.T(f, i, u)):
+            i += s2
+            if i in banned:
+                return None
+            res = unifyWithHeadNS(csub, fsub, [i]+banned, u, s2, c1, s1
+                                  ) if f else unifyCategoryNS(csub, fsub, [i]+banned, u, s2, c1, s1)
+            if res is None:
+                return None
+            (c3, csub2, fsub2) = res
+            return (c3, alter(i, SubstVal(c3), csub2), fsub2)
+        case (cat.NP(f1), cat.NP(f2)):
+            res = unifyFeaturesNS(fsub, f1, s1, f2, s2)
+            if res is None:
+                return None
+            (f3, fsub2) = res
+            return (cat.NP(f3), csub, fsub2)
+        case (cat.S(f1), cat.S(f2)):
+            res = unifyFeaturesNS(fsub, f1, s1, f2, s2)
+            if res is None:
+                return None
+            (f3, fsub2) = res
+            return (cat.S(f3), csub, fsub2)
+        case (cat.Sbar(f1), cat.Sbar(f2)):
+            res = unifyFeaturesNS(fsub, f1, s1, f2, s2)
+            if res is None:
+                return None
+            (f3, fsub2) = res
+            return (cat.Sbar(f3), csub, fsub2)
+        case (cat.SL(c3, c4), cat.SL(c5, c6)):
+            res = unifyCategoryNS(csub, fsub, banned, c4, s1, c6, s2)
+            if res is None:
+                return None
+            (c7, csub2, fsub2) = res
+            res = unifyCategoryNS(csub2, fsub2, banned, c3, s1, c5, s2)
+            if res is None:
+                return None
+            (c8, csub3, fsub3) = res
+            return (cat.SL(c8, c7), csub3, fsub3)
+        case (cat.BS(c3, c4), cat.BS(c5, c6)):
+            res = unifyCategoryNS(csub, fsub, banned, c4, s1, c6, s2)
+            if res is None:
+                return None
+            (c7, csub2, fsub2) = res
+            res = unifyCategoryNS(csub2, fsub2, banned, c3, s1, c5, s2)
+            if res is None:
+                return None
+            (c8, csub3, fsub3) = res
+            return (cat.BS(c8, c7), csub3, fsub3)
+        case (cat.N, cat.N):
+            return (cat.N, csub, fsub)
+        case (cat.CONJ, cat.CONJ):
+            return (cat.CONJ, csub, fsub)
+        case (cat.LPAREN, cat.LPAREN):
+            return (cat.LPAREN, csub, fsub)
+        case (cat.RPAREN, cat.RPAREN):
+            return (cat.RPAREN, csub, fsub)
+        case _:
+            return None
+
+
+def unifyWithHeadNS(csub: Assignment[Cat], fsub: Assignment[FeatureSet], banned: list[int], c1: Cat, s1: int, c2: Cat, s2: int) -> Optional[tuple[Cat, Assignment[Cat], Assignment[FeatureSet]]]:
+    match c2:
+        case cat.SL(x, y):
+            res = unifyWithHeadNS(csub, fsub, banned, c1, s1, x, s2)
+            if res is None:
+                return None
+            x2, csub2, fsub2 = res
+            return (cat.SL(x2, renumberC(y, s2)), csub2, fsub2)
+        case cat.BS(x, y):
+            res = unifyWithHeadNS(csub, fsub, banned, c1, s1, x, s2)
+            if res is None:
+                return None
+            x2, csub2, fsub2 = res
+            return (cat.BS(x2, renumberC(y, s2)), csub2, fsub2)
+        case cat.T(f, i, u):
+            i += s2
+            if i in banned:
+                return None
+            res = unifyCategoryNS(csub, fsub, [i]+banned, c1, s1, u, s2)
+            if res is None:
+                return None
+            (x2, csub2, fsub2) = res
+            return (cat.T(f, i, x2), alter(i, SubstVal(cat.T(f, i, x2)), csub2), fsub2)
+        case _: return unifyCategoryNS(csub, fsub, banned, c1, s1, c2, s2)
+
+
+def unifyFeatureNS(fsub: Assignment[FeatureSet], f1: Feature, s1: int, f2: Feature, s2: int) -> Optional[tuple[Feature, Assignment[FeatureSet]]]:
+    match (f1, f2):
+        case (feature.SF(i, v1), feature.SF(j, v2)):
+            i += s1
+            j += s2
+            if i == j:
+                i2, v1_2 = fetchValue(fsub, i, v1)
+                v3 = v1_2 & v2
+                if v3 == 0:
+                    return None
+                return (feature.SF(i2, v3), alter(i2, SubstVal(v3), fsub))
+            i2, v1_2 = fetchValue(fsub, i, v1)
+            j2, v2_2 = fetchValue(fsub, j, v2)
+            v3 = v1_2 & v2_2
+            if v3 == 0:
+                return None
+            ijmax = max(i2, j2)
+            ijmin = min(i2, j2)
+            return (feature.SF(ijmin, v3), alter(ijmax, SubstLink(ijmin), alter(ijmin, SubstVal(v3), fsub)))
+        case (feature.SF(i, v1), feature.F(v2)):
+            i2, v1_2 = fetchValue(fsub, i + s1, v1)
+            v3 = v1_2 & v2
+            if v3 == 0:
+                return None
+            return (feature.SF(i2, v3), alter(i2, SubstVal(v3), fsub))
+        case (feature.F(v1), feature.SF(j, v2)):
+            j2, v2_2 = fetchValue(fsub, j + s2, v2)
+            v3 = v1 & v2_2
+            if v3 == 0:
+                return None
+            return (feature.SF(j2, v3), alter(j2, SubstVal(v3), fsub))
+        case (feature.F(v1), feature.F(v2)):
+            v3 = v1 & v2
+            if v3 == 0:
+                return None
+            return (feature.F(v3), fsub)
+        case _: raise Exception(f"unrecognized case {f1} {f2}")
+
+
+def unifyFeaturesNS(fsub: Assignment[FeatureSet], f1: list[Feature], s1: int, f2: list[Feature], s2: int) -> Optional[tuple[list[Feature], Assignment[FeatureSet]]]:
+    if len(f1) != len(f2):
+        return None
+    results = []
+    for f1h, f2h in zip(f1, f2):
+        res = unifyFeatureNS(fsub, f1h, s1, f2h, s2)
+        if res is None:
+            return None
+        f3h, fsub = res
+        results.append(f3h)
+    return (results, fsub)
+
+
+def simulSubstituteCVNS(csub: Assignment[Cat], fsub: Assignment[FeatureSet], c: Cat, s: int) -> Cat:
+    """`simulSubstituteCV` of `c` in the namespace with the offset `s`, which gives a renumbered category."""
+    if s == 0:
+        return simulSubstituteCV(csub, fsub, c)
+    if c.maximumIndex == 0:
+        return c
+    match c:
+        case cat.T(_, i, _):
+            _, v = csub.fetch(i + s, None)
+            return renumberC(c, s) if v is None else v
+        case cat.SL(ca, cb):
+            return cat.SL(simulSubstituteCVNS(csub, fsub, ca, s), simulSubstituteCVNS(csub, fsub, cb, s))
+        case cat.BS(ca, cb):
+            return cat.BS(simulSubstituteCVNS(csub, fsub, ca, s), simulSubstituteCVNS(csub, fsub, cb, s))
+        case cat.S(f):
+            return cat.S(simulSubstituteFVNS(fsub, f, s))
+        case cat.Sbar(f):
+            return cat.Sbar(simulSubstituteFVNS(fsub, f, s))
+        case cat.NP(f):
+            return cat.NP(simulSubstituteFVNS(fsub, f, s))
+        case _: return c
+
+
+def simulSubstituteFVNS(fsub: Assignment[FeatureSet], fs: list[Feature], s: int) -> list[Feature]:
+    results = []
+    for f in fs:
+        match f:
+            case feature.SF(i, v):
+                j, v2 = fetchValue(fsub, i + s, v)
+                results.append(feature.SF(j, v2))
+            case feature.F(_): results.append(f)
+            case _: raise Exception("unrecognized feature")
+    return results
+
+
+class Renumbering:
+    """The unification mode which renumbers a daughter with `incrementIndexC` before unification."""
+
+    @staticmethod
+    def unify(csub: Assignment[Cat], fsub: Assignment[FeatureSet], banned: list[int], c1: Cat, s1: int, c2: Cat, s2: int) -> Optional[tuple[Cat, Assignment[Cat], Assignment[FeatureSet]]]:
+        return unifyCategory(csub, fsub, banned,
+                             incrementIndexC(c1, s1) if s1 else c1,
+                             incrementIndexC(c2, s2) if s2 else c2)
+
+    @staticmethod
+    def substitute(csub: Assignment[Cat], fsub: Assignment[FeatureSet], c: Cat, s: int) -> Cat:
+        return simulSubstituteCV(csub, fsub, incrementIndexC(c, s) if s else c)
+
+
+class Namespacing:
+    """The unification mode which keeps the variables of the daughters apart by their namespaces."""
+
+    @staticmethod
+    def unify(csub: Assignment[Cat], fsub: Assignment[FeatureSet], banned: list[int], c1: Cat, s1: int, c2: Cat, s2: int) -> Optional[tuple[Cat, Assignment[Cat], Assignment[FeatureSet]]]:
+        return unifyCategoryNS(csub, fsub, banned, c1, s1, c2, s2)
+
+    @staticmethod
+    def substitute(csub: Assignment[Cat], fsub: Assignment[FeatureSet], c: Cat, s: int) -> Cat:
+        return simulSubstituteCVNS(csub, fsub, c, s)
+
+
+UnificationMode = type[Renumbering] | type[Namespacing]
+
+"""
+The unification mode used by the binary rules. Use `setUnificationMode` to change it.
+"""
+unificationMode: UnificationMode = Namespacing
+
+
+def setUnificationMode(mode: UnificationMode) -> None:
+    global unificationMode, unificationModeGeneration
+    unificationMode = mode
+    # 結果は変数の番号の付け方までは一致しないので、キャッシュを捨てる
+    # 各文法（解析器のスレッドごとの文法も含む）のキャッシュは、次に規則を適用するときに捨てられる
+    unificationCache.clear()
+    unificationModeGeneration += 1
+
+
+def derivationScore(rs: RuleSymbol, scores: list[float]) -> float:
+    """the score of a node derived by a rule from the daughters with the given scores."""
+    match rs:
+        case RuleSymbol.PAREN:
+            return scores[1]
+        case RuleSymbol.COORD:
+            return scores[0] * scores[2]
+        case RuleSymbol.WRAP:
+            return scores[0] * 0.9
+        case _:
+            return scores[0] * scores[1]
+
+
 def wrapNode(node: Node) -> Node:
     return Node(
         rs=RuleSymbol.WRAP,
@@ -982,18 +1687,199 @@ def testBFC():
             let tForHead = Cat.T(true, 1, c1)
             let tNotForHead = Cat.T(false, 1, c1)
             // unifyWithHeadは成功する
-            let uwh = unifyWithHead([], [], [], c1, c2)
+            let uwh = unifyWithHead(Assignment(), Assignment(), [], c1, c2)
             XCTAssertNotNil(uwh)
             // unifyCategoryはtForHeadに対してのみ成功する
-            let uct = unifyCategory([], [], [], tForHead, c2)
+            let uct = unifyCategory(Assignment(), Assignment(), [], tForHead, c2)
             XCTAssertNotNil(uct)
-            let ucf = unifyCategory([], [], [], tNotForHead, c2)
+            let ucf = unifyCategory(Assignment(), Assignment(), [], tNotForHead, c2)
             XCTAssertNil(ucf)
         }
     }
 """
 
 
+def testBinaryRules():
+    def applyAllRules(lnode: Node, rnode: Node) -> list[Node]:
+        prevlist: list[Node] = []
+        for rule in [forwardFunctionApplicationRule, backwardFunctionApplicationRule,
+                     forwardFunctionComposition1Rule, backwardFunctionComposition1Rule,
+                     forwardFunctionComposition2Rule, backwardFunctionComposition2Rule,
+                     backwardFunctionComposition3Rule, forwardFunctionCrossedComposition1Rule,
+                     forwardFunctionCrossedComposition2Rule, forwardFunctionCrossedSubstitutionRule]:
+            prevlist = rule(lnode, rnode, prevlist)
+        return prevlist
+
+    np_ga = cat.NP([feature.F([FV.Ga])])
+    cats = [
+        np_ga,
+        cat.N,
+        cat.SL(cat.NP([feature.F([FV.Nc])]), cat.NP([feature.F([FV.Nc])])),
+        cat.BS(defS(verb, [FV.Term]), np_ga),
+        cat.BS(cat.BS(defS(verb, [FV.Term]), np_ga),
+               cat.NP([feature.F([FV.O])])),
+        cat.BS(cat.SL(cat.T(False, 1, defS(verb, [FV.Term])), np_ga), np_ga),
+        node_です.cat,
+        constructPredicate("長い", [FV.Ai], [FV.Term, FV.Attr])[0],
+    ]
+    symbols = [RuleSymbol.LEX, RuleSymbol.EC, RuleSymbol.FFC1,
+               RuleSymbol.BFC2, RuleSymbol.FFA]
+    nodes = [Node(rs, "", c, [], 1.0, "") for c in cats for rs in symbols]
+    ruleCounters.clear()
+    for lnode in nodes:
+        for rnode in nodes:
+            assert binaryRules(lnode, rnode, []) == applyAllRules(lnode, rnode)
+    stats = ruleCounters.stats()
+    assert ruleCounters.pairs == len(nodes) ** 2
+    assert stats["BFA"]["fired"] > 0 and stats["FFSx"]["skipped"] > 0
+
+    # 索引による結合は、全ての組を順に試すのと同じ結果を同じ順に返す
+    for mode in [Namespacing, Renumbering]:
+        setUnificationMode(mode)
+        expected: list[Node] = []
+        for lnode in nodes:
+            for rnode in nodes:
+                binaryRulesInto(lnode, rnode, expected)
+        ruleCounters.clear()
+        sink: list[Node] = []
+        binaryRulesJoinInto(NodeIndex(nodes), NodeIndex(nodes), sink)
+        assert sink == expected
+        stats = ruleCounters.stats()
+        assert ruleCounters.pairs == len(nodes) ** 2
+        assert stats["FFA"]["avoided"] > 0 and stats["BFA"]["avoided"] > 0
+        for ec in nodes:
+            compiled = CompiledEmptyCategory(ec)
+            expected = []
+            sink = []
+            for node in nodes:
+                binaryRulesInto(ec, node, expected)
+                binaryRulesInto(node, ec, expected)
+                emptyCategoryRulesInto(compiled, node, sink)
+            assert sink == expected
+            # 覚えておく鍵は範疇のクラスとヘッドだけで、範疇そのものは持たない
+            assert all(part is None or isinstance(part, (type, RuleSymbol)) for shape in compiled.rules
+                       for part in (shape[0], shape[1], *shape[2]))
+
+    # 一部の規則の文法は、その規則による結果だけを自身のキャッシュとカウンタで導出する
+    symbols = [RuleSymbol.BFA, RuleSymbol.FFC1, RuleSymbol.FFSx]
+    subset = Grammar(rule for rule in binaryRuleList if rule.symbol in symbols)
+    expected = []
+    for lnode in nodes:
+        for rnode in nodes:
+            binaryRulesInto(lnode, rnode, expected)
+    pairs = ruleCounters.pairs
+    sink = []
+    subset.binaryRulesJoinInto(NodeIndex(nodes), NodeIndex(nodes), sink)
+    assert sink == [node for node in expected if node.rs in symbols] and len(sink) > 0
+    assert subset.counters.pairs == len(nodes) ** 2 and ruleCounters.pairs == pairs
+    assert subset.cache.misses > 0 and subset.counters.stats()["FFA"]["fired"] == 0
+    for ec in nodes:
+        compiled = CompiledEmptyCategory(ec, subset)
+        expected = []
+        sink = []
+        for node in nodes:
+            subset.binaryRulesInto(ec, node, expected)
+            subset.binaryRulesInto(node, ec, expected)
+            emptyCategoryRulesInto(compiled, node, sink)
+        assert sink == expected
+    # 単一化の方式を変えると、文法のキャッシュにある前の方式の結果は使われない
+    mode = unificationMode
+    setUnificationMode(Renumbering if mode is Namespacing else Namespacing)
+    try:
+        expected = []
+        for lnode in nodes:
+            for rnode in nodes:
+                binaryRulesInto(lnode, rnode, expected)
+        sink = []
+        subset.binaryRulesJoinInto(NodeIndex(nodes), NodeIndex(nodes), sink)
+        assert sink == [node for node in expected if node.rs in symbols]
+        assert subset.cache.misses > 0 and subset.generation == unificationModeGeneration
+    finally:
+        setUnificationMode(mode)
+
+    conj = Node(RuleSymbol.LEX, "、", cat.CONJ, [], 1.0, "")
+    conjuncts = nodes + [Node(rs, "", cat.SL(cat.T(True, 1, defS(verb, [FV.Term])), np_ga), [], 1.0, "")
+                         for rs in [RuleSymbol.LEX, RuleSymbol.COORD]]
+    expected = []
+    for lnode in conjuncts:
+        for rnode in conjuncts:
+            coordinationRuleInto(lnode, conj, rnode, expected)
+    sink = []
+    coordinationRuleJoinInto(NodeIndex(conjuncts), conj, NodeIndex(conjuncts), sink)
+    assert sink == expected and len(sink) > 0
+    setUnificationMode(Namespacing)
+
+
+def alphaEquivalent(c1: Cat, c2: Cat) -> bool:
+    """checks if two categories are the same up to a consistent renaming of the category variables and the shared features."""
+    cmap: dict[int, int] = dict()
+    fmap: dict[int, int] = dict()
+
+    def rename(mp: dict[int, int], i: int, j: int) -> bool:
+        # 一対一の対応になっていることを確かめる
+        if mp.setdefault(i, j) != j:
+            return False
+        return mp.setdefault(-j - 1, i) == i
+
+    def features(fs1: list[Feature], fs2: list[Feature]) -> bool:
+        if len(fs1) != len(fs2):
+            return False
+        for f1, f2 in zip(fs1, fs2):
+            match (f1, f2):
+                case (feature.SF(i, v1), feature.SF(j, v2)):
+                    if v1 != v2 or not rename(fmap, i, j):
+                        return False
+                case (feature.F(v1), feature.F(v2)):
+                    if v1 != v2:
+                        return False
+                case _:
+                    return False
+        return True
+
+    def category(c1: Cat, c2: Cat) -> bool:
+        match (c1, c2):
+            case (cat.T(f1, i, u1), cat.T(f2, j, u2)):
+                return f1 == f2 and rename(cmap, i, j) and category(u1, u2)
+            case (cat.SL(x1, y1), cat.SL(x2, y2)) | (cat.BS(x1, y1), cat.BS(x2, y2)):
+                return category(x1, x2) and category(y1, y2)
+            case (cat.S(fs1), cat.S(fs2)) | (cat.NP(fs1), cat.NP(fs2)) | (cat.Sbar(fs1), cat.Sbar(fs2)):
+                return features(fs1, fs2)
+            case _:
+                return c1 == c2
+    return category(c1, c2)
+
+
+def testNamespacedUnification():
+    import random
+    from lexicon.myLexicon import myLexicon, emptyCategories
+    cats = sorted(set(node.cat for node in myLexicon + emptyCategories),
+                  key=str)
+    pairs = [(l, r) for l in cats for r in cats]
+    pairs = random.Random(0).sample(pairs, min(len(pairs), 20000))
+    mode = unificationMode
+    derived = 0
+    try:
+        for l, r in pairs:
+            for rule in binaryRuleList:
+                setUnificationMode(Renumbering)
+                expected = rule.function(l, r)
+                setUnificationMode(Namespacing)
+                actual = rule.function(l, r)
+                if expected is None:
+                    assert actual is None
+                else:
+                    assert actual is not None and alphaEquivalent(
+                        expected, actual), (rule.symbol, l, r)
+                    derived += 1
+    finally:
+        setUnificationMode(mode)
+    assert derived > 0
+    assert alphaEquivalent(cat.T(True, 1, cat.SL(cat.T(False, 2, cat.N), cat.T(False, 1, cat.N))),
+                           cat.T(True, 3, cat.SL(cat.T(False, 1, cat.N), cat.T(False, 3, cat.N))))
+    assert not alphaEquivalent(cat.SL(cat.T(False, 1, cat.N), cat.T(False, 2, cat.N)),
+                               cat.SL(cat.T(False, 1, cat.N), cat.T(False, 1, cat.N)))
+
+
 def testUnifyWithHead():
     c1 = defS(verb, [FV.Stem, FV.Attr])
     # c2のヘッド
@@ -1003,12 +1889,12 @@ def testUnifyWithHead():
     tForHead = cat.T(True, 1, c1)
     tNotForHead = cat.T(False, 1, c1)
     # unifyWithHeadは成功する
-    uwh = unifyWithHead([], [], [], c1, c2)
+    uwh = unifyWithHead(Assignment(), Assignment(), [], c1, c2)
     assert uwh is not None
     # unifyCategoryはtForHeadに対してのみ成功する
-    uct = unifyCategory([], [], [], tForHead, c2)
+    uct = unifyCategory(Assignment(), Assignment(), [], tForHead, c2)
     assert uct is not None
-    ucf = unifyCategory([], [], [], tNotForHead, c2)
+    ucf = unifyCategory(Assignment(), Assignment(), [], tNotForHead, c2)
     assert ucf is None
 
 
@@ -1017,5 +1903,7 @@ if __name__ == "__main__":
     testBFA()
     testFFC()
     testBFC()
+    testBinaryRules()
 
     testUnifyWithHead()
+    testNamespacedUnification()
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import TypeAlias, Union, TypeVar, Generic
+from typing import TypeAlias, Union, TypeVar, Generic, Iterable, Optional
 
 @dataclass
 class SubstLink:
@@ -16,4 +16,79 @@ class SubstVal(Generic[T1]):
 
 
 SubstData: TypeAlias = Union[SubstLink, SubstVal[T1]]
-Assignment: TypeAlias = list[tuple[int, SubstData]]
+
+
+class Assignment(Generic[T1]):
+    """
+    A substitution store which maps an index either to a value (`SubstVal`) or to a smaller index (`SubstLink`).
+
+    The store is updated in place: unification threads a single store linearly,
+    so binding is O(1) instead of rebuilding a list of pairs.
+    Every update is recorded on a trail, and `rollback` undoes the updates made after a `mark`.
+    Links are not compressed, because the binding of an index that has been linked may be overwritten later,
+    which would change the result of `fetch` for the indices compressed past it.
+    """
+    __slots__ = ("bindings", "trail")
+
+    def __init__(self, pairs: Iterable[tuple[int, SubstData[T1]]] = ()):
+        self.bindings: dict[int, SubstData[T1]] = dict(pairs)
+        self.trail: list[tuple[int, Optional[SubstData[T1]]]] = []
+
+    def bind(self, i: int, data: SubstData[T1]) -> "Assignment[T1]":
+        self.trail.append((i, self.bindings.get(i)))
+        self.bindings[i] = data
+        return self
+
+    def fetch(self, i: int, v: T1) -> tuple[int, T1]:
+        """returns the representative index of `i` and its value (or `v` if it has no value)."""
+        bindings = self.bindings
+        while True:
+            data = bindings.get(i)
+            if data is None:
+                return (i, v)
+            if isinstance(data, SubstLink):
+                if data.index < i:
+                    i = data.index
+                else:
+                    return (i, v)
+            else:
+                return (i, data.value)
+
+    def mark(self) -> int:
+        return len(self.trail)
+
+    def rollback(self, mark: int) -> None:
+        while len(self.trail) > mark:
+            i, data = self.trail.pop()
+            if data is None:
+                del self.bindings[i]
+            else:
+                self.bindings[i] = data
+
+    def __iter__(self):
+        return iter(self.bindings.items())
+
+    def __len__(self) -> int:
+        return len(self.bindings)
+
+    def __repr__(self) -> str:
+        return f"Assignment({list(self.bindings.items())})"
+
+
+def testAssignment():
+    sub: Assignment[str] = Assignment()
+    assert sub.fetch(3, "x") == (3, "x")
+    sub.bind(1, SubstVal("a"))
+    m = sub.mark()
+    sub.bind(3, SubstLink(2)).bind(2, SubstLink(1))
+    assert sub.fetch(3, "x") == (1, "a")
+    # 大きい番号へのリンクは辿らない
+    sub.bind(1, SubstLink(5))
+    assert sub.fetch(3, "x") == (1, "x")
+    sub.rollback(m)
+    assert sub.fetch(3, "x") == (3, "x")
+    assert sub.fetch(1, "x") == (1, "a")
+
+
+if __name__ == "__main__":
+    testAssignment()
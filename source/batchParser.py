@@ -0,0 +1,108 @@
+"""
+Parsing many sentences in parallel with a pool of processes.
+
+    python batchParser.py [beam] [workers] [ordered|completed] < sentences.txt
+
+prints the best result of each line of the input as `sentence<TAB>pf` (in the order of the input unless `completed`).
+"""
+import contextlib
+import io
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, Optional
+
+from node import Node
+
+
+def initializeWorker() -> None:
+    """loads the lexicon once in each worker. The workers parse by the parsers which print nothing (see `parseInWorker`)."""
+    from lexicon.lexicon import loadLexiconIndex
+    loadLexiconIndex()
+
+
+def parseInWorker(beam: int, sentence: str, pruning: bool) -> list[Node]:
+    import chartParser
+    return chartParser.defaultParser(beam, pruning, verbose=False).parse(sentence)
+
+
+def parseMany(sentences: Iterable[str], beam: int, workers: Optional[int] = None, ordered: bool = True,
+              inflight: Optional[int] = None, pruning: bool = False) -> Iterator[tuple[int, list[Node]]]:
+    """
+    parses the sentences by `simpleParse` in `workers` processes (the number of the CPUs by default),
+    and yields the pairs of the position of each sentence in `sentences` and its results.
+    The results are yielded in the order of the sentences if `ordered`, and as soon as they are parsed otherwise.
+    At most `inflight` sentences (twice the number of the workers by default) are sent to the workers at a time,
+    so that `sentences` can be a long stream read lazily.
+    With one worker, the sentences are parsed in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    inflight = max(inflight or 2 * workers, 1)
+    if workers == 1:
+        import chartParser
+        parser = chartParser.defaultParser(beam, pruning, verbose=False)
+        for n, sentence in enumerate(sentences):
+            yield (n, parser.parse(sentence))
+        return
+    with ProcessPoolExecutor(workers, initializer=initializeWorker) as executor:
+        queue = ((n, executor.submit(parseInWorker, beam, sentence, pruning))
+                 for n, sentence in enumerate(sentences))
+        if ordered:
+            window: deque[tuple[int, Future]] = deque()
+            for submitted in queue:
+                window.append(submitted)
+                if len(window) == inflight:
+                    n, future = window.popleft()
+                    yield (n, future.result())
+            while window:
+                n, future = window.popleft()
+                yield (n, future.result())
+        else:
+            pending: dict[Future, int] = dict()
+            for n, submitted in queue:
+                pending[submitted] = n
+                if len(pending) == inflight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield (pending.pop(future), future.result())
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield (pending.pop(future), future.result())
+
+
+def testParseMany():
+    import chartParser
+    sentences = ["太郎を殴る", "当施設", "長い本です", "静かな猫", "太郎が本を読んだ"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [chartParser.simpleParse(10, sentence) for sentence in sentences]
+    assert [results for _, results in parseMany(sentences, 10, workers=2, inflight=2)] == expected
+    unordered = dict(parseMany(sentences, 10, workers=2, ordered=False, inflight=3))
+    assert [unordered[n] for n in range(len(sentences))] == expected
+    assert [results for _, results in parseMany(sentences, 10, workers=1)] == expected
+
+
+def main(args: list[str]) -> None:
+    beam = int(args[0]) if len(args) > 0 else 10
+    workers = int(args[1]) if len(args) > 1 else None
+    ordered = args[2] != "completed" if len(args) > 2 else True
+    # 入力は少しずつ読み、結果を出力するまで文を覚えておく
+    sentences: dict[int, str] = dict()
+
+    def read() -> Iterator[str]:
+        for n, line in enumerate(sys.stdin):
+            sentences[n] = line.strip()
+            yield sentences[n]
+    for n, results in parseMany(read(), beam, workers, ordered):
+        print(f"{sentences.pop(n)}\t{results[0].pf if results else ''}", flush=True)
+
+
+if __name__ == "__main__":
+    match sys.argv[1:]:
+        case ["test"]:
+            testParseMany()
+        case ["-h" | "--help", *_]:
+            print(__doc__)
+        case args:
+            main(args)
@@ -0,0 +1,179 @@
+"""
+Benchmarks for lightbluePy.
+
+    python benchmark.py import [repeat]
+    python benchmark.py rules [beam] [sentence ...]
+    python benchmark.py chart [beam] [length ...]
+    python benchmark.py pruning [beam] [length ...]
+    python benchmark.py wavefront [beam] [workers ...]
+"""
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+from statistics import median
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SENTENCES = [
+    "太郎が本を読んだ",
+    "花子と太郎が東京へ行った",
+    "当施設は傷ついた犬猫問わず受け入れます",
+    "昨日、太郎が本を読み、花子が文を処理した",
+    "（太郎）が行く",
+    "長い本です",
+]
+
+
+def timeImport(env: dict[str, str]) -> float:
+    """measures the time to import `lexicon.myLexicon` in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import lexicon.myLexicon; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=SOURCE_DIR,
+                         env=os.environ | env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip())
+
+
+def benchImport(repeat: int = 3) -> None:
+    # スナップショットが古ければここで作り直される
+    timeImport({})
+    lark_times = [timeImport({"LIGHTBLUE_NO_SNAPSHOT": "1"})
+                  for _ in range(repeat)]
+    snapshot_times = [timeImport({}) for _ in range(repeat)]
+    print(f"import lexicon.myLexicon (median of {repeat})")
+    print(f"  lark parse : {median(lark_times):8.3f} s")
+    print(f"  snapshot   : {median(snapshot_times):8.3f} s")
+
+
+def benchRules(beam: int = 10, sentences: list[str] = SENTENCES) -> None:
+    import CCG
+    import chartParser
+    CCG.ruleCounters.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for sentence in sentences:
+            chartParser.parse(beam, sentence)
+    counters = CCG.ruleCounters
+    print(f"binary rules over {counters.pairs} pairs of nodes (beam {beam})")
+    print(f"  {'rule':6} {'fired':>10} {'rejected':>10} {'skipped':>10} {'avoided':>10}")
+    for rule, counts in counters.stats().items():
+        print(
+            f"  {rule:6} {counts['fired']:10} {counts['rejected']:10} {counts['skipped']:10} {counts['avoided']:10}")
+
+
+def textOfLength(length: int) -> str:
+    """joins the sample sentences with "、" into a text of the given length."""
+    text = ""
+    while len(text) < length:
+        text += SENTENCES[len(text) % len(SENTENCES)] + "、"
+    return text[:length]
+
+
+def benchChart(beam: int = 10, lengths: list[int] = [20, 50, 100]) -> None:
+    import chartParser
+    print(f"parse time by the length of the input (beam {beam})")
+    previous = None
+    for length in lengths:
+        text = textOfLength(length)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            chart = chartParser.parseChart(beam, text)
+            elapsed = time.perf_counter() - start
+        ratio = f"x{elapsed / previous:.1f}" if previous else ""
+        print(
+            f"  {length:4} chars: {elapsed:8.3f} s {len(chart):6} cells {ratio}")
+        previous = elapsed
+
+
+def benchPruning(beam: int = 10, lengths: list[int] = [20, 50, 100]) -> None:
+    """compares cube pruning with the exhaustive application of the binary rules."""
+    import chartParser
+
+    def signature(nodes):
+        return [(node.rs, node.pf, node.cat, node.score) for node in nodes]
+
+    def result(chart):
+        match chartParser.extractParseResult(beam, chart):
+            case chartParser.Full(nodes) | chartParser.Partial(nodes):
+                return signature(nodes[:1])
+            case _:
+                return []
+
+    texts = SENTENCES + [textOfLength(length) for length in lengths]
+    chartParser.pruningCounters.clear()
+    total = {"exhaustive": 0.0, "pruning": 0.0}
+    cells = differentCells = differentResults = 0
+    print(f"cube pruning vs exhaustive (beam {beam})")
+    for text in texts:
+        charts = dict()
+        for mode in total:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                charts[mode] = chartParser.parseChart(
+                    beam, text, pruning=mode == "pruning")
+                elapsed = time.perf_counter() - start
+            total[mode] += elapsed
+        exhaustive, pruned = charts["exhaustive"], charts["pruning"]
+        diff = sum(1 for key in exhaustive
+                   if signature(exhaustive[key]) != signature(pruned.get(key, [])))
+        same = result(exhaustive) == result(pruned)
+        cells += len(exhaustive)
+        differentCells += diff
+        differentResults += 0 if same else 1
+        print(f"  {len(text):4} chars: {diff:5}/{len(exhaustive):5} cells differ, best result {'same' if same else 'differs'}")
+    stats = chartParser.pruningCounters.stats()
+    print(f"cells differ: {differentCells}/{cells}, best results differ: {differentResults}/{len(texts)}")
+    print(f"pairs tried: {stats['tried']}/{stats['pairs']}")
+    print(f"time: exhaustive {total['exhaustive']:.3f} s, pruning {total['pruning']:.3f} s")
+
+
+def benchWavefront(beam: int = 10, workers: list[int] = [2, 4], lengths: list[int] = [50, 100, 200]) -> None:
+    """compares the parallel chart by diagonals with the serial one, by the length of the input and the number of the workers."""
+    import chartParser
+    import wavefrontParser
+    print(f"wavefront parse time by the length of the input and the number of the workers (beam {beam}, {os.cpu_count()} CPUs)")
+    print(f"  {'chars':>5} {'serial':>9}" + "".join(f" {f'{n} workers':>16}" for n in workers))
+    parser = chartParser.Parser(beam)
+    pools = {n: wavefrontParser.WavefrontPool(parser, n) for n in workers}
+    try:
+        for length in lengths:
+            text = textOfLength(length)
+            start = time.perf_counter()
+            parser.parseChart(text)
+            serial = time.perf_counter() - start
+            times = []
+            for n in workers:
+                start = time.perf_counter()
+                pools[n].parseChart(text, minimumLength=0)
+                times.append(time.perf_counter() - start)
+            print(f"  {length:5} {serial:7.3f} s" +
+                  "".join(f" {t:7.3f} s x{serial / t:4.1f}" for t in times))
+    finally:
+        for pool in pools.values():
+            pool.close()
+
+
+if __name__ == "__main__":
+    match sys.argv[1:]:
+        case ["import"]:
+            benchImport()
+        case ["import", repeat]:
+            benchImport(int(repeat))
+        case ["rules"]:
+            benchRules()
+        case ["rules", beam, *sentences]:
+            benchRules(int(beam), sentences or SENTENCES)
+        case ["chart"]:
+            benchChart()
+        case ["chart", beam, *lengths]:
+            benchChart(int(beam), [int(l) for l in lengths] or [20, 50, 100])
+        case ["pruning"]:
+            benchPruning()
+        case ["pruning", beam, *lengths]:
+            benchPruning(int(beam), [int(l) for l in lengths] or [20, 50, 100])
+        case ["wavefront"]:
+            benchWavefront()
+        case ["wavefront", beam, *workers]:
+            benchWavefront(int(beam), [int(n) for n in workers] or [2, 4])
+        case _:
+            print(__doc__)
@@ -1,62 +1,302 @@
-from dataclasses import dataclass
-from typing import TypeAlias, Union, TypeVar, Generic
+from typing import Any, Iterable, Optional, TypeAlias, Union
 
-from feature import Feature
+from hashcons import HashConsed
+import feature
+from feature import Feature, FeatureSet
+from feature import FeatureValue as FV
 
+"""
+Categories are immutable and hash-consed: there is only one instance for each distinct category,
+so that `==` is an identity check and categories can be used as dictionary keys.
+N, CONJ, LPAREN and RPAREN have no fields, and the classes themselves are used as the categories.
+"""
 
-@dataclass
-class S:
-    features: list[Feature]
+bunsetsuKatsuyo: FeatureSet = feature.toFeatureSet(
+    [FV.Cont, FV.Term, FV.Attr, FV.Hyp, FV.Imper, FV.Pre, FV.NTerm, FV.NStem, FV.TeForm, FV.NiForm])
 
 
-@dataclass
-class NP:
-    features: list[Feature]
+noIndices: frozenset[int] = frozenset()
 
 
-@dataclass
-class N:
-    pass
+def unionOfIndices(a: frozenset[int], b: frozenset[int]) -> frozenset[int]:
+    # 片方が部分集合なら新しい集合を作らない
+    if b <= a:
+        return a
+    if a <= b:
+        return b
+    return a | b
 
 
-@dataclass
-class Sbar:
-    features: list[Feature]
+class Category(HashConsed):
+    """
+    A base class of the categories with fields.
+    The properties of a category which are tested by the rules are computed from those of its subcategories
+    when the canonical instance is created, so that each test is an attribute read:
 
+    - numberOfArguments: the number of the arguments of a functional category
+    - maximumIndex: the largest index of the category variables and the shared features
+    - isBunsetsu: if the category can appear on the left adjacent of a punctuation
+    - endsWithT: if the result of the forward slashes is a category variable
+    - isNStem: if the head is S with the NStem form
+    - isNoncaseNP: if the category is NPnc
+    - isTNoncaseNP: if the category is T\\NPnc
+    - isArgumentCategory: if the category is NP with a case or Sbar
+    - numberOfArgs: the key to sort the parse results
+    - categoryIndices: the indices of the category variables
+    - featureIndices: the indices of the shared features
+    - head: the class of the base category at the end of the results, where a category variable is its restriction.
+      Two categories are unifiable only if they have the same head.
+    """
+    __slots__ = ("numberOfArguments", "maximumIndex", "isBunsetsu", "endsWithT", "isNStem",
+                 "isNoncaseNP", "isTNoncaseNP", "isArgumentCategory", "numberOfArgs",
+                 "categoryIndices", "featureIndices", "head")
+    numberOfArguments: int
+    maximumIndex: int
+    isBunsetsu: bool
+    endsWithT: bool
+    isNStem: bool
+    isNoncaseNP: bool
+    isTNoncaseNP: bool
+    isArgumentCategory: bool
+    numberOfArgs: int
+    categoryIndices: frozenset[int]
+    featureIndices: frozenset[int]
+    head: type
+
+    def setProperties(self, numberOfArguments: int = 0, maximumIndex: int = 0, isBunsetsu: bool = True,
+                      endsWithT: bool = False, isNStem: bool = False, isNoncaseNP: bool = False,
+                      isTNoncaseNP: bool = False, isArgumentCategory: bool = False, numberOfArgs: int = 0,
+                      categoryIndices: frozenset[int] = noIndices, featureIndices: frozenset[int] = noIndices,
+                      head: Optional[type] = None) -> None:
+        object.__setattr__(self, "numberOfArguments", numberOfArguments)
+        object.__setattr__(self, "maximumIndex", maximumIndex)
+        object.__setattr__(self, "isBunsetsu", isBunsetsu)
+        object.__setattr__(self, "endsWithT", endsWithT)
+        object.__setattr__(self, "isNStem", isNStem)
+        object.__setattr__(self, "isNoncaseNP", isNoncaseNP)
+        object.__setattr__(self, "isTNoncaseNP", isTNoncaseNP)
+        object.__setattr__(self, "isArgumentCategory", isArgumentCategory)
+        object.__setattr__(self, "numberOfArgs", numberOfArgs)
+        object.__setattr__(self, "categoryIndices", categoryIndices)
+        object.__setattr__(self, "featureIndices", featureIndices)
+        object.__setattr__(self, "head", type(self) if head is None else head)
+
+
+class AtomicCategory:
+    """The properties of N, CONJ, LPAREN and RPAREN, as class attributes."""
+    numberOfArguments = 0
+    maximumIndex = 0
+    isBunsetsu = True
+    endsWithT = False
+    isNStem = False
+    isNoncaseNP = False
+    isTNoncaseNP = False
+    isArgumentCategory = False
+    numberOfArgs = 100
+    categoryIndices = noIndices
+    featureIndices = noIndices
+    head: type
+
+
+def indicesOfFeatures(features: Iterable[Feature]) -> frozenset[int]:
+    indices = frozenset(f.index for f in features if isinstance(f, feature.SF))
+    return indices if indices else noIndices
+
+
+class S(Category):
+    __slots__ = ("features",)
+    __match_args__ = ("features",)
+    features: tuple[Feature, ...]
+
+    @classmethod
+    def normalize(cls, features: Iterable[Feature]) -> tuple[Any, ...]:
+        return (tuple(features),)
+
+    def derive(self) -> None:
+        indices = indicesOfFeatures(self.features)
+        match self.features:
+            case (_, f, *_):
+                katsuyo = f.features
+                self.setProperties(
+                    maximumIndex=max(indices, default=0),
+                    # 活用形の判定は従来の`|`による判定のまま
+                    isBunsetsu=bool(bunsetsuKatsuyo | katsuyo),
+                    isNStem=bool(katsuyo & feature.bit(FV.NStem)),
+                    numberOfArgs=1,
+                    featureIndices=indices)
+            case _:
+                self.setProperties(
+                    maximumIndex=max(indices, default=0), numberOfArgs=1, featureIndices=indices)
+
+
+class NP(Category):
+    __slots__ = ("features",)
+    __match_args__ = ("features",)
+    features: tuple[Feature, ...]
+
+    @classmethod
+    def normalize(cls, features: Iterable[Feature]) -> tuple[Any, ...]:
+        return (tuple(features),)
+
+    def derive(self) -> None:
+        indices = indicesOfFeatures(self.features)
+        noncase = len(self.features) > 0 and bool(
+            self.features[0].features & feature.bit(FV.Nc))
+        self.setProperties(
+            maximumIndex=max(indices, default=0),
+            isNoncaseNP=noncase,
+            isArgumentCategory=not noncase,
+            numberOfArgs=10,
+            featureIndices=indices)
+
+
+class N(AtomicCategory):
+    isBunsetsu = False
+    numberOfArgs = 2
 
-@dataclass
-class CONJ:
-    pass
 
+class Sbar(Category):
+    __slots__ = ("features",)
+    __match_args__ = ("features",)
+    features: tuple[Feature, ...]
 
-@dataclass
-class LPAREN:
+    @classmethod
+    def normalize(cls, features: Iterable[Feature]) -> tuple[Any, ...]:
+        return (tuple(features),)
+
+    def derive(self) -> None:
+        indices = indicesOfFeatures(self.features)
+        self.setProperties(
+            maximumIndex=max(indices, default=0),
+            isArgumentCategory=True,
+            numberOfArgs=0,
+            featureIndices=indices)
+
+
+class CONJ(AtomicCategory):
     pass
 
 
-@dataclass
-class RPAREN:
+class LPAREN(AtomicCategory):
+    isBunsetsu = False
+
+
+class RPAREN(AtomicCategory):
     pass
 
 
-@dataclass
-class SL:
+class SL(Category):
+    __slots__ = ("left", "right")
+    __match_args__ = ("left", "right")
     left: "Cat"
     right: "Cat"
 
+    def derive(self) -> None:
+        self.setProperties(
+            numberOfArguments=self.left.numberOfArguments + 1,
+            maximumIndex=max(self.left.maximumIndex, self.right.maximumIndex),
+            isBunsetsu=self.left.isBunsetsu,
+            endsWithT=self.left.endsWithT,
+            numberOfArgs=self.left.numberOfArgs + 1,
+            categoryIndices=unionOfIndices(
+                self.left.categoryIndices, self.right.categoryIndices),
+            featureIndices=unionOfIndices(self.left.featureIndices, self.right.featureIndices),
+            head=self.left.head)
 
-@dataclass
-class BS:
+
+class BS(Category):
+    __slots__ = ("left", "right")
+    __match_args__ = ("left", "right")
     left: "Cat"
     right: "Cat"
 
+    def derive(self) -> None:
+        self.setProperties(
+            numberOfArguments=self.left.numberOfArguments + 1,
+            maximumIndex=max(self.left.maximumIndex, self.right.maximumIndex),
+            isBunsetsu=self.left.isBunsetsu,
+            isNStem=self.left.isNStem,
+            isTNoncaseNP=isinstance(self.left, T) and self.right.isNoncaseNP,
+            numberOfArgs=self.left.numberOfArgs + 1,
+            categoryIndices=unionOfIndices(
+                self.left.categoryIndices, self.right.categoryIndices),
+            featureIndices=unionOfIndices(self.left.featureIndices, self.right.featureIndices),
+            head=self.left.head)
+
 
-@dataclass
-class T:
+class T(Category):
+    __slots__ = ("is_closed", "index", "restriction")
+    __match_args__ = ("is_closed", "index", "restriction")
     is_closed: bool
     index: int
     restriction: "Cat"
 
+    @classmethod
+    def normalize(cls, is_closed: bool, index: int, restriction: "Cat") -> tuple[Any, ...]:
+        return (bool(is_closed), int(index), restriction)
+
+    def derive(self) -> None:
+        self.setProperties(
+            maximumIndex=max(self.index, self.restriction.maximumIndex),
+            endsWithT=True,
+            numberOfArgs=self.restriction.numberOfArgs,
+            categoryIndices=unionOfIndices(
+                self.restriction.categoryIndices, frozenset([self.index])),
+            featureIndices=self.restriction.featureIndices,
+            head=self.restriction.head)
+
+
+for atom in (N, CONJ, LPAREN, RPAREN):
+    atom.head = atom
+
+
+Cat: TypeAlias = Union[S, NP, type[N], Sbar,
+                       type[CONJ], type[LPAREN], type[RPAREN], SL, BS, T]
+
+
+def testHashConsing():
+    import feature
+    from feature import F, SF
+    from feature import FeatureValue as FV
+    import pickle
+    c1 = SL(NP([F([FV.Ga, FV.O])]), S([SF(1, [FV.P, FV.M])]))
+    c2 = SL(NP([F([FV.O, FV.Ga, FV.O])]), S((SF(1, (FV.M, FV.P)),)))
+    assert c1 is c2
+    assert c1 == c2 and hash(c1) == hash(c2)
+    assert c1 != SL(NP([F([FV.Ga])]), S([SF(1, [FV.P, FV.M])]))
+    assert T(True, 1, N) is T(1, 1, N)
+    assert pickle.loads(pickle.dumps(c1)) is c1
+    match c1:
+        case SL(NP([F(v)]), _):
+            assert v == feature.toFeatureSet([FV.Ga, FV.O])
+        case _:
+            assert False
+    try:
+        c1.left = N
+        assert False
+    except AttributeError:
+        pass
+
+
+def testProperties():
+    from feature import F, SF
+    np_ga = NP([F([FV.Ga])])
+    np_nc = NP([F([FV.Nc])])
+    c = BS(BS(S([SF(2, [FV.V1]), F([FV.NStem])]), np_ga), T(False, 3, np_nc))
+    assert c.numberOfArguments == 2 and c.numberOfArgs == 3
+    assert c.maximumIndex == 3
+    assert c.isNStem and not c.endsWithT
+    assert SL(T(True, 1, S([F([FV.V1])])), np_ga).endsWithT
+    assert BS(T(True, 1, N), np_nc).isTNoncaseNP
+    assert not BS(T(True, 1, N), np_ga).isTNoncaseNP
+    assert np_ga.isArgumentCategory and not np_nc.isArgumentCategory
+    assert not SL(N, N).isBunsetsu and not LPAREN.isBunsetsu
+    assert CONJ.numberOfArgs == 100 and N.numberOfArgs == 2
+    assert c.categoryIndices == {3} and c.featureIndices == {2}
+    assert np_ga.categoryIndices is noIndices and N.featureIndices is noIndices
+    assert c.head is S and SL(T(True, 1, N), np_ga).head is N and CONJ.head is CONJ
+
 
-Cat: TypeAlias = Union[S, NP, N, Sbar,
-                       CONJ, LPAREN, RPAREN, SL, BS, T]
+if __name__ == "__main__":
+    testHashConsing()
+    testProperties()
@@ -1,7 +1,12 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 # enum
-from typing import TypeAlias, Union
+from collections.abc import Iterable, Iterator, Mapping
+from itertools import islice
+from typing import Optional, TypeAlias, Union
 from functools import reduce
+import heapq
+import threading
+import weakref
 
 import cat
 import feature
@@ -11,8 +16,9 @@ from feature import FeatureValue as FV
 from node import Node
 import CCG
 
-from lexicon.lexicon import setupLexicon, emptyCategories, lookupLexicon
+from lexicon.lexicon import LexiconIndex, setupLexicon, emptyCategories, lexicalSpans
 from lexicon.template import modifiableS, lexicalitem
+from unificationCache import UnificationCache
 
 """
 type Chart = M.Map (Int,Int) [CCG.Node]
@@ -20,15 +26,161 @@ type Chart = M.Map (Int,Int) [CCG.Node]
 Chart: TypeAlias = dict[tuple[int, int], list[Node]]
 
 
-def parse(beam: int, sentence: str) -> Chart:
-    """Main parsing function to parse a Japanees sentence and generates a CYK-chart."""
+class ChartArray(Mapping[tuple[int, int], list[Node]]):
+    """
+    A CYK-chart of a text of length `n`, which is filled in place during parsing.
+    The cell (i, j) (0 <= i < j <= n) is stored in `cells[j][i]`, and is None until it is filled.
+    As a read-only mapping from (i, j) to the nodes of the filled cells, it can be used in place of `Chart`.
+    The index of the nodes of a cell for the binary rules (see `CCG.NodeIndex`) is kept in `indices[j][i]`.
+    The chart also keeps track of the non-empty cells starting and ending at each position,
+    and of the positions of the one-letter cells with CONJ, LPAREN or RPAREN,
+    so that the rules visit only the split points where both sides have some nodes.
+    """
+    __slots__ = ("n", "cells", "indices", "ends", "starts", "positions")
+
+    def __init__(self, n: int):
+        self.n = n
+        self.cells: list[list[Optional[list[Node]]]] = [
+            [None] * j for j in range(n+1)]
+        self.indices: list[list[Optional[CCG.NodeIndex]]] = [
+            [None] * j for j in range(n+1)]
+        self.ends: list[set[int]] = [set() for _ in range(n+1)]
+        """ends[i]: the positions j such that the cell (i, j) is non-empty"""
+        self.starts: list[set[int]] = [set() for _ in range(n+1)]
+        """starts[j]: the positions i such that the cell (i, j) is non-empty"""
+        self.positions: dict[Cat, set[int]] = {
+            cat.CONJ: set(), cat.LPAREN: set(), cat.RPAREN: set()}
+        """the positions k such that the cell (k, k+1) has a node of the category"""
+
+    def index(self, i: int, j: int) -> Optional[CCG.NodeIndex]:
+        """the index of the nodes of the cell (i, j), or None if the cell is empty."""
+        index = self.indices[j][i]
+        if index is None:
+            nodes = self.cells[j][i]
+            if not nodes:
+                return None
+            index = self.indices[j][i] = CCG.NodeIndex(nodes)
+        return index
+
+    def get(self, key: tuple[int, int], default=None):
+        i, j = key
+        if 0 <= i < j <= self.n:
+            nodes = self.cells[j][i]
+            if nodes is not None:
+                return nodes
+        return default
+
+    def __getitem__(self, key: tuple[int, int]) -> list[Node]:
+        nodes = self.get(key)
+        if nodes is None:
+            raise KeyError(key)
+        return nodes
+
+    def __setitem__(self, key: tuple[int, int], nodes: list[Node]) -> None:
+        i, j = key
+        if not 0 <= i < j <= self.n:
+            raise KeyError(key)
+        self.cells[j][i] = nodes
+        self.indices[j][i] = None
+        if nodes:
+            self.ends[i].add(j)
+            self.starts[j].add(i)
+        else:
+            self.ends[i].discard(j)
+            self.starts[j].discard(i)
+        if j == i+1:
+            for c, positions in self.positions.items():
+                if any(node.cat == c for node in nodes):
+                    positions.add(i)
+                else:
+                    positions.discard(i)
+
+    def splitPoints(self, i: int, j: int) -> list[int]:
+        """the positions k (i < k < j) such that both the cells (i, k) and (k, j) are non-empty, in the ascending order."""
+        ends, starts = self.ends[i], self.starts[j]
+        if len(starts) < len(ends):
+            ends, starts = starts, ends
+        return sorted(k for k in ends if k in starts and i < k < j)
+
+    def positionsOf(self, c: Cat, i: int, j: int) -> list[int]:
+        """the positions k (i <= k < j) such that the cell (k, k+1) has a node of the category `c` (CONJ, LPAREN or RPAREN)."""
+        return sorted(k for k in self.positions[c] if i <= k < j)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        for j, row in enumerate(self.cells):
+            for i in range(j-1, -1, -1):
+                if row[i] is not None:
+                    yield (i, j)
+
+    def __len__(self) -> int:
+        return sum(1 for row in self.cells for nodes in row if nodes is not None)
+
+    def toChart(self) -> Chart:
+        return dict(self.items())
+
+
+class PruningCounters:
+    """Counts the pairs of nodes which cube pruning tried or skipped."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.pairs = 0
+        self.tried = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"pairs": self.pairs, "tried": self.tried, "skipped": self.pairs - self.tried}
+
+
+class ParserContext:
+    """
+    What the parsing functions use besides their arguments: the lexicon (the default one if None),
+    the grammar with its unification cache and counters, the empty categories compiled for the grammar,
+    the counters of cube pruning, and whether the progress is printed.
+    A context is used by one thread at a time (see `Parser`).
+    """
+
+    def __init__(self, lexicon: Optional[LexiconIndex], grammar: CCG.Grammar,
+                 pruningCounters: Optional[PruningCounters] = None, verbose: bool = True):
+        self.lexicon = lexicon
+        self.grammar = grammar
+        self.emptyCategories = [CCG.CompiledEmptyCategory(ec, grammar) for ec in (
+            emptyCategories if lexicon is None else lexicon.emptyCategories)]
+        """the empty categories compiled into the patterns of the categories they can combine with"""
+        self.pruningCounters = PruningCounters() if pruningCounters is None else pruningCounters
+        self.verbose = verbose
+
+
+"""
+The context of the module-level functions, with the default lexicon, `CCG.defaultGrammar` and the module-level counters.
+"""
+defaultContext = ParserContext(None, CCG.defaultGrammar)
+pruningCounters = defaultContext.pruningCounters
+compiledEmptyCategories = defaultContext.emptyCategories
+
+
+def parse(beam: int, sentence: str, pruning: bool = False, context: ParserContext = defaultContext) -> Chart:
+    """
+    Main parsing function to parse a Japanees sentence and generates a CYK-chart.
+    With `pruning`, the binary rules are applied by cube pruning (see `checkBinaryRulesPrunedInto`),
+    which is faster but may give a different chart.
+    """
+    return parseChart(beam, sentence, pruning, context).toChart()
+
+
+def parseChart(beam: int, sentence: str, pruning: bool = False, context: ParserContext = defaultContext) -> ChartArray:
+    """`parse` which returns the chart as it is filled."""
     if sentence == "":
-        return {}
+        return ChartArray(0)
     else:
-        lexicon = setupLexicon(sentence.replace("―", "。"))
-        print([(lex.pf, lex.source) for lex in lexicon])
+        lexicon = setupLexicon(sentence.replace("―", "。"), context.lexicon, context.verbose)
+        if context.verbose:
+            print([(lex.pf, lex.source) for lex in lexicon])
+        text = purifyText(sentence)
+        spans = lexicalSpans(text, lexicon, context.lexicon)
         chart, _, _, _ = reduce(lambda acc, c: chartAccumulator(
-            beam, lexicon, acc, c), purifyText(sentence), ({}, [0], 0, ""))
+            beam, spans, acc, c, pruning, context), text, (ChartArray(len(text)), [0], 0, ""))
         return chart
 
 
@@ -48,44 +200,45 @@ def purifyText(text: str) -> str:
             return c + purifyText(t)
 
 
-PartialChart: TypeAlias = tuple[Chart, list[int], int, str]
+PartialChart: TypeAlias = tuple[ChartArray, list[int], int, str]
 """
 quadruples representing a state during parsing:
-- the parsed result (Chart) of the left of the pivot,
+- the chart, in which the left of the pivot has been parsed,
 - the stack of ending positions of the previous 'separators' (i.e. '、','，',etc),
 - the pivot (=the current parsing position), and
 - the revsersed list of chars that has been parsed
 """
 
 
-def chartAccumulator(beam: int, lexicon: list[Node], partialChart: PartialChart, c: str) -> PartialChart:
+def chartAccumulator(beam: int, spans: dict[tuple[int, int], list[Node]], partialChart: PartialChart, c: str, pruning: bool = False,
+                     context: ParserContext = defaultContext) -> PartialChart:
     chart, seplist, i, stack = partialChart
-    print(c, stack)
+    if context.verbose:
+        print(c, stack)
     newstack = c + stack
     if c == "、":
         # (foldl' (punctFilter sep i) [] $ M.toList chart);
-        newchart = {(i, i+1): [andCONJ(c), emptyCM(c)]} | {key: value for key, value in (reduce(lambda acc,
-                                                                                                e: punctFilter(seplist[0], i, acc, e), chart.copy().items(), []))}
-        return (newchart, ([i+1] + seplist), (i+1), newstack)
+        punctFilter(seplist[0], i, chart)
+        chart[(i, i+1)] = [andCONJ(c), emptyCM(c)]
+        return (chart, ([i+1] + seplist), (i+1), newstack)
     elif c == "。":
-        newchart = {key: value for key, value in (reduce(lambda acc,
-                                                         e: punctFilter(seplist[0], i, acc, e),  chart.copy().items(), []))}
-        return (newchart, ([i+1] + seplist), (i+1), newstack)
+        punctFilter(seplist[0], i, chart)
+        return (chart, ([i+1] + seplist), (i+1), newstack)
     else:
-        newchart, _, _, _ = reduce(lambda acc, c: boxAccumulator(
-            beam, lexicon, acc, c), newstack, (chart.copy(), "", i, i+1))
+        reduce(lambda acc, c: boxAccumulator(
+            beam, spans, acc, c, pruning, context), newstack, (chart, "", i, i+1))
         newseps = [i+1] + seplist if c in ["「",
                                            "『"] else seplist[1:] if c in ["」", "』"] else seplist
-        return (newchart, newseps, (i+1), newstack)
+        return (chart, newseps, (i+1), newstack)
 
 
-def punctFilter(sep: int, i: int, charList: list[tuple[tuple[int, int], list[Node]]], e: tuple[tuple[int, int], list[Node]]) -> list[tuple[tuple[int, int], list[Node]]]:
-    from_, to = e[0]
-    nodes = e[1]
-    if to == i:
-        return [((from_, to+1), list(filter(lambda n: CCG.isBunsetsu(n.cat), nodes)))] + [e] + charList
-    else:
-        return [e] + charList
+def punctFilter(sep: int, i: int, chart: ChartArray) -> None:
+    """extends the cells ending at `i` over the punctuation at `i`, keeping only the nodes which can precede a punctuation."""
+    for from_ in range(i):
+        nodes = chart.get((from_, i))
+        if nodes is not None:
+            chart[(from_, i+1)] = list(
+                filter(lambda n: n.cat.isBunsetsu, nodes))
 
 
 def andCONJ(c: str) -> Node:
@@ -96,87 +249,200 @@ def emptyCM(c: str) -> Node:
     return lexicalitem(c, "punct", 99, cat.BS(cat.SL(cat.T(True, 1, modifiableS), cat.BS(cat.T(True, 1, modifiableS), cat.NP([feature.F([FV.Ga, FV.O])]))), cat.NP([feature.F([FV.Nc])])))
 
 
-PartialBox: TypeAlias = tuple[Chart, str, int, int]
+PartialBox: TypeAlias = tuple[ChartArray, str, int, int]
 
 
-def boxAccumulator(beam: int, lexicon: list[Node], partialBox: PartialBox, c: str) -> PartialBox:
+def boxAccumulator(beam: int, spans: dict[tuple[int, int], list[Node]], partialBox: PartialBox, c: str, pruning: bool = False,
+                   context: ParserContext = defaultContext) -> PartialBox:
     chart, word, i, j = partialBox
     newword = c + word
-    list0 = lookupLexicon(newword, lexicon) if len(newword) < 23 else []
-    list1 = checkEmptyCategories(checkParenthesisRule(i, j, chart, checkCoordinationRule(
-        i, j, chart, checkBinaryRules(i, j, chart, checkUnaryRules(list0.copy())))))
-    newchart = {k: v for k, v in chart.items()}
-    newchart[(i, j)] = sorted(
-        list1, key=lambda n: n.score, reverse=True)[:beam]
-    return (newchart, newword, i-1, j)
+    fillBox(beam, spans, chart, i, j, pruning, context)
+    return (chart, newword, i-1, j)
+
+
+def fillBox(beam: int, spans: dict[tuple[int, int], list[Node]], chart: ChartArray, i: int, j: int, pruning: bool = False,
+            context: ParserContext = defaultContext) -> None:
+    """fills the cell (i, j), where all the cells in it have been filled."""
+    # 語彙項目は文の走査時に見つけた(i, j)の位置からそのまま取り出す
+    list0 = spans.get((i, j), [])
+    # sinkは候補を導出された順に持つ（従来のリストの逆順）
+    sink = list0[::-1]
+    checkUnaryRulesInto(sink)
+    if pruning:
+        checkBinaryRulesPrunedInto(i, j, chart, sink, beam, context)
+    else:
+        checkBinaryRulesInto(i, j, chart, sink, context)
+    checkCoordinationRuleInto(i, j, chart, sink)
+    checkParenthesisRuleInto(i, j, chart, sink)
+    checkEmptyCategoriesInto(sink, context)
+    sink.reverse()
+    chart[(i, j)] = packNodes(
+        sorted(sink, key=lambda n: n.score, reverse=True), beam)
+
+
+def fillCell(beam: int, spans: dict[tuple[int, int], list[Node]], text: str, chart: ChartArray, i: int, j: int, pruning: bool = False,
+             context: ParserContext = defaultContext) -> None:
+    """
+    fills the cell (i, j) of the chart of `text` as `chartAccumulator` does, where all the cells in it have been filled.
+    The cells ending after a punctuation are the ones ending before it, filtered by `punctFilter`.
+    """
+    c = text[j-1]
+    if c == "、" or c == "。":
+        if i == j-1:
+            if c == "、":
+                chart[(i, j)] = [andCONJ(c), emptyCM(c)]
+        else:
+            nodes = chart.get((i, j-1))
+            if nodes is not None:
+                chart[(i, j)] = list(filter(lambda n: n.cat.isBunsetsu, nodes))
+    else:
+        fillBox(beam, spans, chart, i, j, pruning, context)
+
+
+def packNodes(nodes: list[Node], beam: int) -> list[Node]:
+    """
+    packs the nodes (sorted by scores) of a cell into the ones with distinct categories and guard classes (see `CCG.guardClasses`).
+    The best derivation of each group represents the others, which are kept as its `alternatives` (up to `beam` derivations in total).
+    Only the representatives take part in the rules, so the nodes whose rule symbols are banned by different rules are not packed together.
+    The beam is applied to the representatives.
+    """
+    groups: dict[tuple[Cat, frozenset], list[Node]] = dict()
+    for node in nodes:
+        groups.setdefault(
+            (node.cat, CCG.guardClasses[node.rs]), []).append(node)
+    packed = []
+    for derivations in groups.values():
+        if len(packed) == beam:
+            break
+        representative = derivations[0]
+        if len(derivations) > 1:
+            # 語彙項目は他の文の解析と共有されているので、書き換えずに複製する
+            representative = replace(
+                representative, alternatives=tuple(derivations[1:beam]))
+        packed.append(representative)
+    return packed
+
+
+def lookupChart(i: int, j: int, chart: ChartArray) -> list[Node]:
+    return chart.get((i, j), [])
 
 
-def lookupChart(i: int, j: int, chart: Chart) -> list[Node]:
-    return chart.get((i, j), [])
+"""
+The check functions apply the rules to the nodes in the chart, and add the derived nodes to a sink (see CCG.py).
+The ones with `prevlist` are the wrappers which return the derived nodes in front of `prevlist`.
+"""
 
 
 def checkUnaryRules(prevlist: list[Node]) -> list[Node]:
-    return reduce(lambda acc, node: CCG.unaryRules(node, acc), prevlist, prevlist.copy())
-
-
-def checkBinaryRules(i: int, j: int, chart: Chart, prevlist: list[Node]) -> list[Node]:
-    return reduce(lambda acck, k:
-                  reduce(lambda accl, lnode:
-                         reduce(lambda accr, rnode:
-                                CCG.binaryRules(lnode, rnode, accr),
-                                lookupChart(k, j, chart),
-                                accl.copy()
-                                ),
-                         lookupChart(i, k, chart),
-                         acck.copy()
-                         ),
-                  range(i+1, j),
-                  prevlist.copy()
-                  )
-
-
-def checkCoordinationRule(i: int, j: int, chart: Chart, prevlist: list[Node]) -> list[Node]:
-    return reduce(lambda acck, k:
-                  reduce(lambda accc, cnode:
-                         reduce(lambda accl, lnode:
-                                reduce(lambda accr, rnode:
-                                       CCG.coordinationRule(
-                                           lnode, cnode, rnode, accr),
-                                       lookupChart(k+1, j, chart),
-                                       accl.copy()
-                                       ),
-                                lookupChart(i, k, chart),
-                                accc.copy()
-                                ),
-                         filter(lambda n: n.cat == cat.CONJ,
-                                lookupChart(k, k+1, chart)),
-                         acck.copy()
-                         ),
-                  range(i+1, j-1),
-                  prevlist.copy()
-                  )
-
-
-def checkParenthesisRule(i: int, j: int, chart: Chart, prevlist: list[Node]) -> list[Node]:
-    if i+3 <= j:
-        return reduce(lambda accl, lnode:
-                      reduce(lambda accr, rnode:
-                             reduce(lambda accc, cnode:
-                                    CCG.parenthesisRule(
-                                        lnode, cnode, rnode, accc),
-                                    lookupChart(i+1, j-1, chart),
-                                    accr.copy()
-                                    ),
-                             filter(lambda n: n.cat == cat.RPAREN,
-                                    lookupChart(j-1, j, chart)),
-                             accl.copy()
-                             ),
-                      filter(lambda n: n.cat == cat.LPAREN,
-                             lookupChart(i, i+1, chart)),
-                      prevlist.copy()
-                      )
-    else:
-        return prevlist.copy()
+    sink = prevlist[::-1]
+    checkUnaryRulesInto(sink)
+    return sink[::-1]
+
+
+def checkUnaryRulesInto(sink: list[Node]) -> None:
+    for node in sink[::-1]:
+        CCG.unaryRulesInto(node, sink)
+
+
+def checkBinaryRules(i: int, j: int, chart: ChartArray, prevlist: list[Node]) -> list[Node]:
+    sink = prevlist[::-1]
+    checkBinaryRulesInto(i, j, chart, sink)
+    return sink[::-1]
+
+
+def checkBinaryRulesInto(i: int, j: int, chart: ChartArray, sink: list[Node], context: ParserContext = defaultContext) -> None:
+    for k in chart.splitPoints(i, j):
+        lindex = chart.index(i, k)
+        rindex = chart.index(k, j)
+        assert lindex is not None and rindex is not None
+        context.grammar.binaryRulesJoinInto(lindex, rindex, sink)
+
+
+def checkBinaryRulesPrunedInto(i: int, j: int, chart: ChartArray, sink: list[Node], beam: int,
+                               context: ParserContext = defaultContext) -> None:
+    """
+    `checkBinaryRulesInto` by cube pruning.
+    Since the cells are sorted by scores and the score of a derived node is the product of the scores of the daughters,
+    the pairs of nodes for each split are tried in the descending order of the products,
+    starting from the pair of the best ones and moving to the next ones in the left or the right cell.
+    The enumeration stops when the beam is full and no remaining pair can beat the worst node in it.
+    The result may differ from `checkBinaryRulesInto`, since the pruned nodes are no longer
+    available to the empty categories, and the order of the nodes with the same score may change.
+    """
+    worst = heapq.nlargest(beam, (node.score for node in sink))
+    heapq.heapify(worst)
+    queue: list[tuple[float, int, int, int]] = []
+    cells: dict[int, tuple[list[Node], list[Node]]] = dict()
+    for k in chart.splitPoints(i, j):
+        lnodes = lookupChart(i, k, chart)
+        rnodes = lookupChart(k, j, chart)
+        cells[k] = (lnodes, rnodes)
+        context.pruningCounters.pairs += len(lnodes) * len(rnodes)
+        if lnodes[-1].score < 0 or rnodes[-1].score < 0:
+            # 負のスコアがあると積の大小が単調でないので、全ての組を入れておく
+            for a, lnode in enumerate(lnodes):
+                for b, rnode in enumerate(rnodes):
+                    queue.append((-lnode.score * rnode.score, k, a, b))
+        else:
+            queue.append((-lnodes[0].score * rnodes[0].score, k, 0, 0))
+    heapq.heapify(queue)
+    queued = set((k, a, b) for _, k, a, b in queue)
+    while queue:
+        negscore, k, a, b = heapq.heappop(queue)
+        if len(worst) >= beam and -negscore < worst[0]:
+            break
+        lnodes, rnodes = cells[k]
+        start = len(sink)
+        context.grammar.binaryRulesInto(lnodes[a], rnodes[b], sink)
+        context.pruningCounters.tried += 1
+        for node in sink[start:]:
+            if len(worst) < beam:
+                heapq.heappush(worst, node.score)
+            elif node.score > worst[0]:
+                heapq.heapreplace(worst, node.score)
+        for a2, b2 in ((a+1, b), (a, b+1)):
+            if a2 < len(lnodes) and b2 < len(rnodes) and (k, a2, b2) not in queued:
+                queued.add((k, a2, b2))
+                heapq.heappush(
+                    queue, (-lnodes[a2].score * rnodes[b2].score, k, a2, b2))
+
+
+def checkCoordinationRule(i: int, j: int, chart: ChartArray, prevlist: list[Node]) -> list[Node]:
+    sink = prevlist[::-1]
+    checkCoordinationRuleInto(i, j, chart, sink)
+    return sink[::-1]
+
+
+def checkCoordinationRuleInto(i: int, j: int, chart: ChartArray, sink: list[Node]) -> None:
+    for k in chart.positionsOf(cat.CONJ, i+1, j-1):
+        lindex = chart.index(i, k)
+        rindex = chart.index(k+1, j)
+        if lindex is None or rindex is None:
+            continue
+        for cnode in lookupChart(k, k+1, chart):
+            if cnode.cat == cat.CONJ:
+                CCG.coordinationRuleJoinInto(lindex, cnode, rindex, sink)
+
+
+def checkParenthesisRule(i: int, j: int, chart: ChartArray, prevlist: list[Node]) -> list[Node]:
+    sink = prevlist[::-1]
+    checkParenthesisRuleInto(i, j, chart, sink)
+    return sink[::-1]
+
+
+def checkParenthesisRuleInto(i: int, j: int, chart: ChartArray, sink: list[Node]) -> None:
+    if i+3 > j:
+        return
+    if i not in chart.positions[cat.LPAREN] or j-1 not in chart.positions[cat.RPAREN]:
+        return
+    for lnode in lookupChart(i, i+1, chart):
+        if lnode.cat != cat.LPAREN:
+            continue
+        for rnode in lookupChart(j-1, j, chart):
+            if rnode.cat != cat.RPAREN:
+                continue
+            for cnode in lookupChart(i+1, j-1, chart):
+                CCG.parenthesisRuleInto(lnode, cnode, rnode, sink)
 
 
 """
@@ -185,40 +451,146 @@ def checkParenthesisRule(i: int, j: int, chart: Chart, prevlist: list[Node]) ->
 
 
 def checkEmptyCategories(prevlist: list[Node]) -> list[Node]:
-    assert prevlist is not None
-
-    def update_inner(l: list[Node], node: Node, ec: Node):
-        assert l is not None
-        bin_ec_node = CCG.binaryRules(ec, node, l.copy())
-        assert bin_ec_node is not None
-        bin_node_ec = CCG.binaryRules(node, ec, bin_ec_node)
-        assert bin_node_ec is not None
-        return bin_node_ec
-
-    def update_outer(p: list[Node], ec: Node):
-        assert p is not None
-        result = reduce(lambda l, node: update_inner(l, node, ec),
-                        p, p.copy())
-        assert result is not None
-        return result
-
-    return reduce(update_outer,
-                  emptyCategories,
-                  prevlist.copy()
-                  )
-
-
-def simpleParse(beam: int, sentence: str) -> list[Node]:
-    chart = parse(beam, sentence)
-    for key, value in chart.items():
-        print(key, [node.pf for node in value])
-    match extractParseResult(beam, chart):
-        case Full(nodes):
-            return nodes
-        case Partial(nodes):
-            return nodes
-        case Failed():
-            return []
+    sink = prevlist[::-1]
+    checkEmptyCategoriesInto(sink)
+    return sink[::-1]
+
+
+def checkEmptyCategoriesInto(sink: list[Node], context: ParserContext = defaultContext) -> None:
+    for ec in context.emptyCategories:
+        # 各空範疇は、それ以前の空範疇までで得られた候補（従来のリストの順）に適用する
+        for node in sink[::-1]:
+            context.grammar.emptyCategoryRulesInto(ec, node, sink)
+
+
+class ParserStats:
+    """The counts of the unification caches, the binary rules and cube pruning, summed over contexts."""
+
+    def __init__(self):
+        self.cache = dict.fromkeys(["hits", "misses", "size"], 0)
+        self.rules = {rs.name: dict.fromkeys(["fired", "rejected", "skipped", "avoided"], 0)
+                      for rs in CCG.ruleMasks}
+        self.pruning = dict.fromkeys(["pairs", "tried", "skipped"], 0)
+
+    def add(self, grammar: CCG.Grammar, pruningCounters: PruningCounters, live: bool = True) -> None:
+        """adds the counts of a context. The entries of the cache are counted only if it is `live`."""
+        cache = grammar.cache.stats()
+        for key in ["hits", "misses"] + (["size"] if live else []):
+            self.cache[key] += cache[key]
+        for name, counts in grammar.counters.stats().items():
+            for key, count in counts.items():
+                self.rules[name][key] += count
+        for key, count in pruningCounters.stats().items():
+            self.pruning[key] += count
+
+    def merge(self, other: "ParserStats") -> None:
+        for key, count in other.cache.items():
+            self.cache[key] += count
+        for name, counts in other.rules.items():
+            for key, count in counts.items():
+                self.rules[name][key] += count
+        for key, count in other.pruning.items():
+            self.pruning[key] += count
+
+    def asDict(self) -> dict[str, dict]:
+        return {"cache": dict(self.cache), "rules": {name: dict(counts) for name, counts in self.rules.items()},
+                "pruning": dict(self.pruning)}
+
+
+def retireContext(lock: threading.RLock, retired: ParserStats, grammar: CCG.Grammar, pruningCounters: PruningCounters) -> None:
+    """folds the counts of the context of a finished thread into `retired`."""
+    with lock:
+        retired.add(grammar, pruningCounters, live=False)
+
+
+@dataclass(frozen=True)
+class Parser:
+    """
+    A parser with its own lexicon (the default one if None), binary rules and configuration.
+    Since none of them is changed after the construction, a parser can be used from many threads at once.
+    Each thread parses in its own context (see `ParserContext`), created when the thread first uses the parser,
+    so that the unification cache is kept between the sentences parsed in the thread.
+    The context is released when the thread finishes, and its counts are kept in `retired`.
+    """
+    beam: int
+    pruning: bool = False
+    rules: tuple[CCG.BinaryRule, ...] = tuple(CCG.binaryRuleList)
+    """the binary rules in the order of `CCG.binaryRuleList`"""
+    lexicon: Optional[LexiconIndex] = None
+    cacheSize: int = 100000
+    """the size of the unification cache of each thread"""
+    verbose: bool = False
+    """whether the progress is printed"""
+    local: threading.local = field(
+        default_factory=threading.local, init=False, repr=False, compare=False)
+    contexts: weakref.WeakSet[ParserContext] = field(
+        default_factory=weakref.WeakSet, init=False, repr=False, compare=False)
+    """the contexts of the live threads"""
+    retired: ParserStats = field(
+        default_factory=ParserStats, init=False, repr=False, compare=False)
+    """the counts of the contexts of the finished threads"""
+    lock: threading.RLock = field(
+        default_factory=threading.RLock, init=False, repr=False, compare=False)
+    """guards `contexts` and `retired`"""
+
+    def context(self) -> ParserContext:
+        """the context of the current thread."""
+        context = getattr(self.local, "context", None)
+        if context is None:
+            grammar = CCG.Grammar(self.rules, UnificationCache(self.cacheSize))
+            context = self.local.context = ParserContext(
+                self.lexicon, grammar, verbose=self.verbose)
+            # 終了処理は解析器を参照しないので、解析器の解放を妨げない
+            weakref.finalize(context, retireContext, self.lock, self.retired,
+                             grammar, context.pruningCounters)
+            with self.lock:
+                self.contexts.add(context)
+        return context
+
+    def parseChart(self, sentence: str) -> ChartArray:
+        return parseChart(self.beam, sentence, self.pruning, self.context())
+
+    def parse(self, sentence: str) -> list[Node]:
+        """returns the best results of parsing `sentence`, or the best partial results if there is no full one."""
+        context = self.context()
+        chart = parseChart(self.beam, sentence, self.pruning, context)
+        if context.verbose:
+            for key, value in chart.items():
+                print(key, [node.pf for node in value])
+        match extractParseResult(self.beam, chart):
+            case Full(nodes):
+                return nodes
+            case Partial(nodes):
+                return nodes
+            case Failed():
+                return []
+
+    def stats(self) -> dict[str, dict]:
+        """the counts of the unification caches, the binary rules and cube pruning, summed over the threads."""
+        total = ParserStats()
+        with self.lock:
+            total.merge(self.retired)
+            contexts = list(self.contexts)
+        for context in contexts:
+            total.add(context.grammar, context.pruningCounters)
+        return total.asDict()
+
+
+_defaultParsers: dict[tuple[int, bool, bool], Parser] = dict()
+
+
+def defaultParser(beam: int, pruning: bool = False, verbose: bool = True) -> Parser:
+    """the parser with the default lexicon and rules for `beam`, shared in the process."""
+    key = (beam, pruning, verbose)
+    parser = _defaultParsers.get(key)
+    if parser is None:
+        parser = _defaultParsers.setdefault(
+            key, Parser(beam, pruning, verbose=verbose))
+    return parser
+
+
+def simpleParse(beam: int, sentence: str, pruning: bool = False) -> list[Node]:
+    return defaultParser(beam, pruning).parse(sentence)
 
 
 @ dataclass
@@ -239,28 +611,196 @@ class Failed:
 ParseResult: TypeAlias = Union[Full, Partial, Failed]
 
 
-def extractParseResult(beam: int, chart: Chart) -> ParseResult:
-    def f(c: list[tuple[tuple[int, int], list[Node]]]) -> ParseResult:
-        match c:
-            case []:
-                return Failed()
-            case(((i, _), nodes), *_):
-                if i == 0:
-                    return Full(list(map(CCG.wrapNode, sortByNumberOfArgs(nodes))))
-                else:
-                    return Partial(g(list(map(CCG.wrapNode, sortByNumberOfArgs(nodes))), list(filter(lambda x: x[0][1] <= i, c))))
-            case _:
-                return Failed()
-
-    def g(results: list[Node], cs: list[tuple[tuple[int, int], list[Node]]]) -> list[Node]:
-        match cs:
-            case []:
-                return results
-            case(((i, _), nodes), *rest):
-                return g([CCG.conjoinNodes(x, y) for x in map(CCG.wrapNode, nodes) for y in results][:beam], list(filter(lambda x: x[0][1] <= i, rest)))
+Derivation: TypeAlias = tuple[float, int, tuple[int, ...]]
+"""(the score, the index of the derivation in the packed node, the ranks of the derivations of the daughters)"""
+
+
+class PackedDerivations:
+    """
+    The derivations of a packed node, which are enumerated lazily in the descending order of the scores.
+    `derived` holds the derivations found so far, and `candidates` the ones which can be the next.
+    The node is kept so that its id is not reused while it is a key of `KBest.packed`.
+    """
+    __slots__ = ("node", "edges", "derived", "candidates", "queued", "expanded")
+
+    def __init__(self, node: Node):
+        self.node = node
+        self.edges: tuple[Node, ...] = (node, *node.alternatives)
+        self.derived: list[Derivation] = []
+        self.candidates: list[tuple[float, int, tuple[int, ...], bool]] = []
+        """(the negated score, the index of the derivation, the ranks of the daughters, whether the rule allows the daughters)"""
+        self.queued: set[tuple[int, tuple[int, ...]]] = set()
+        self.expanded = 0
+
+
+class KBest:
+    """
+    Lazy k-best extraction of the derivations from the packed chart (Huang & Chiang 2005, Algorithm 3).
+    A derivation of a packed node is one of the derivations packed in it,
+    with one of the derivations of each daughter (which is also a packed node).
+    Since the score of a node is monotone in the scores of its daughters,
+    the (k+1)-th best derivation is found among the neighbours of the first k ones,
+    and only the derivations needed for it are computed.
+    The best derivation of a packed node is the node itself.
+    A derivation whose rule bans the rule symbol of a derivation of a daughter (see `CCG.bannedDaughters`) is skipped,
+    though its neighbours are still the candidates.
+    """
+
+    def __init__(self):
+        self.packed: dict[int, PackedDerivations] = dict()
+
+    def derivations(self, node: Node) -> Iterator[Node]:
+        """yields the derivations of a packed node in the descending order of the scores."""
+        k = 0
+        while (derivation := self.kth(node, k)) is not None:
+            yield derivation
+            k += 1
+
+    def kth(self, node: Node, k: int) -> Optional[Node]:
+        """the k-th (from 0) best derivation of a packed node, or None if there are no more."""
+        derivation = self.kthDerivation(self.packedDerivations(node), k)
+        if derivation is None:
+            return None
+        return self.build(node, derivation)
+
+    def packedDerivations(self, node: Node) -> PackedDerivations:
+        packed = self.packed.get(id(node))
+        if packed is None:
+            packed = self.packed[id(node)] = PackedDerivations(node)
+            for e, edge in enumerate(packed.edges):
+                self.push(packed, e, (0,) * len(edge.daughters))
+        return packed
+
+    def kthDerivation(self, packed: PackedDerivations, k: int) -> Optional[Derivation]:
+        while len(packed.derived) <= k:
+            if packed.expanded < len(packed.derived):
+                # 直前に取り出した導出の隣を候補に加える
+                _, e, ranks = packed.derived[-1]
+                self.pushNeighbours(packed, e, ranks)
+                packed.expanded = len(packed.derived)
+            if not packed.candidates:
+                return None
+            negscore, e, ranks, allowed = heapq.heappop(packed.candidates)
+            if allowed:
+                packed.derived.append((-negscore, e, ranks))
+            else:
+                # 規則が許さない導出は除くが、その隣には許されるものがありうる
+                self.pushNeighbours(packed, e, ranks)
+        return packed.derived[k]
+
+    def pushNeighbours(self, packed: PackedDerivations, e: int, ranks: tuple[int, ...]) -> None:
+        for d in range(len(ranks)):
+            self.push(packed, e, ranks[:d] + (ranks[d]+1,) + ranks[d+1:])
+
+    def push(self, packed: PackedDerivations, e: int, ranks: tuple[int, ...]) -> None:
+        if (e, ranks) in packed.queued:
+            return
+        edge = packed.edges[e]
+        allowed = True
+        if not any(ranks):
+            # 各娘の最良の導出から成る導出は、圧縮されたノードそのもの
+            score = edge.score
+        else:
+            banned = CCG.bannedDaughters.get(edge.rs)
+            scores = []
+            for d, (daughter, rank) in enumerate(zip(edge.daughters, ranks)):
+                daughterPacked = self.packedDerivations(daughter)
+                derivation = self.kthDerivation(daughterPacked, rank)
+                if derivation is None:
+                    return
+                scores.append(derivation[0])
+                if banned is not None and daughterPacked.edges[derivation[1]].rs in banned[d]:
+                    allowed = False
+            score = CCG.derivationScore(edge.rs, scores)
+        packed.queued.add((e, ranks))
+        heapq.heappush(packed.candidates, (-score, e, ranks, allowed))
+
+    def build(self, node: Node, derivation: Derivation) -> Node:
+        score, e, ranks = derivation
+        edge = self.packed[id(node)].edges[e]
+        if not any(ranks):
+            return edge
+        daughters = []
+        for daughter, rank in zip(edge.daughters, ranks):
+            d = self.kthDerivation(self.packedDerivations(daughter), rank)
+            assert d is not None
+            daughters.append(self.build(daughter, d))
+        banned = CCG.bannedDaughters.get(edge.rs, ())
+        assert all(d.rs not in symbols for d, symbols in zip(daughters, banned))
+        return Node(edge.rs, "".join(d.pf for d in daughters), edge.cat, daughters, score, edge.source)
+
+    def merge(self, nodes: Iterable[Node], key=lambda node: -node.score) -> Iterator[Node]:
+        """
+        yields the derivations of the packed nodes in the order of `key`,
+        which must be consistent with the descending order of the scores for the derivations of each node.
+        """
+        return heapq.merge(*(self.derivations(node) for node in nodes), key=key)
+
+
+def conjoinBest(lnodes: Iterator[Node], rnodes: list[Node], beam: int) -> list[Node]:
+    """
+    conjoins the nodes in `lnodes` and `rnodes` (both in the descending order of the scores),
+    and returns the best `beam` conjunctions in the descending order of the scores.
+    The conjunctions are enumerated best-first from the pair of the best ones,
+    so only the ones next to those already taken are computed, and `lnodes` is consumed only as far as needed.
+    """
+    ls: list[Node] = []
+    results: list[Node] = []
+    candidates: list[tuple[float, int, int, Node]] = []
+    queued: set[tuple[int, int]] = set()
+
+    def push(a: int, b: int) -> None:
+        if (a, b) in queued or b >= len(rnodes):
+            return
+        if a == len(ls):
+            lnode = next(lnodes, None)
+            if lnode is None:
+                return
+            ls.append(lnode)
+        queued.add((a, b))
+        node = CCG.conjoinNodes(ls[a], rnodes[b])
+        heapq.heappush(candidates, (-node.score, a, b, node))
+
+    push(0, 0)
+    while candidates and len(results) < beam:
+        _, a, b, node = heapq.heappop(candidates)
+        results.append(node)
+        if len(results) == beam:
+            break
+        push(a + 1, b)
+        push(a, b + 1)
+    return results
+
+
+def extractParseResult(beam: int, chart: Chart | ChartArray) -> ParseResult:
+    kbest = KBest()
+
+    def best(nodes: list[Node]) -> list[Node]:
+        # 引数の少ない範疇を優先し、同じ数ならスコアの高い順に、上位beam個の導出を取り出す
+        return list(islice(kbest.merge(nodes, key=lambda node: (node.cat.numberOfArgs, -node.score)), beam))
+
     # isLessPrivilegedThanのお気持ち：n文字のやつに対して(0, n)を最優先したい。なぜならこれが一番長い範囲をパースできているから。
     # したがって、まず右側が一番大きいものを、次に左側が一番小さいものを選ぶ
-    return f(list(sorted(filter(lambda x: len(x[1]) > 0, chart.items()), key=lambda x: (x[0][1], -x[0][0]), reverse=True)))
+    c = sorted(filter(lambda x: len(x[1]) > 0, chart.items()),
+               key=lambda x: (x[0][1], -x[0][0]), reverse=True)
+    match c:
+        case []:
+            return Failed()
+        case(((i, _), nodes), *rest):
+            results = list(map(CCG.wrapNode, best(nodes)))
+            if i == 0:
+                return Full(results)
+            results.sort(key=lambda node: -node.score)
+            # 左端に届くまで、すでに覆った範囲の左に接する範囲のうち最も優先されるものを順に連言でつなぐ
+            for (k, j), nodes in rest:
+                if i == 0:
+                    break
+                if j <= i:
+                    results = conjoinBest(map(CCG.wrapNode, kbest.merge(nodes)), results, beam)
+                    i = k
+            return Partial(results)
+        case _:
+            return Failed()
 
 
 """
@@ -276,33 +816,11 @@ isLessPrivilegedThan ((i1,j1),_) ((i2,j2),_) | i1 == i2 && j1 == j2 = EQ
 
 
 def sortByNumberOfArgs(nodes: list[Node]) -> list[Node]:
-    return sorted(nodes, key=lambda node: (numberOfArgs(node.cat), -node.score))
+    return sorted(nodes, key=lambda node: (node.cat.numberOfArgs, -node.score))
 
 
 def numberOfArgs(c: Cat) -> int:
-    match c:
-        case cat.SL(x, _):
-            return numberOfArgs(x) + 1
-        case cat.BS(x, _):
-            return numberOfArgs(x) + 1
-        case cat.T(_, _, c):
-            return numberOfArgs(c)
-        case cat.S(_):
-            return 1
-        case cat.NP(_):
-            return 10
-        case cat.Sbar(_):
-            return 0
-        case cat.N:
-            return 2
-        case cat.CONJ:
-            return 100
-        case cat.LPAREN:
-            return 100
-        case cat.RPAREN:
-            return 100
-        case _:
-            raise Exception(f"unknown category {c}")
+    return c.numberOfArgs
 
 
 def output_node(node: Node) -> str:
@@ -345,11 +863,11 @@ def output_cat(c1: Cat) -> str:
 {indent}{b}, {i}, {output_cat(c)}
 )"""
         case cat.S(f):
-            return f"S{f}"
+            return f"S[{', '.join(map(str, f))}]"
         case cat.NP(f):
-            return f"NP{f}"
+            return f"NP[{', '.join(map(str, f))}]"
         case cat.Sbar(f):
-            return f"Sbar{f}"
+            return f"Sbar[{', '.join(map(str, f))}]"
         case cat.N:
             return "N"
         case cat.CONJ:
@@ -362,6 +880,124 @@ def output_cat(c1: Cat) -> str:
             raise Exception(f"unknown category {c1}")
 
 
+def testOutputCat():
+    np = cat.NP([feature.F([FV.Ga]), feature.F([FV.M])])
+    # 素性はリストと同じ形で出力する
+    assert output_cat(np) == "NP[F([Ga]), F([M])]" and output_cat(cat.Sbar([])) == "Sbar[]"
+
+
+def testChartArray():
+    from node import RuleSymbol
+    chart = ChartArray(4)
+    conj = Node(RuleSymbol.LEX, "、", cat.CONJ, [], 1.0, "")
+    n = Node(RuleSymbol.LEX, "a", cat.N, [], 1.0, "")
+    chart[(0, 1)] = [n]
+    chart[(1, 2)] = [conj]
+    chart[(0, 2)] = []
+    chart[(2, 4)] = [n]
+    chart[(1, 4)] = [n]
+    assert chart.splitPoints(0, 4) == [1]
+    chart[(0, 2)] = [n]
+    assert chart.splitPoints(0, 4) == [1, 2]
+    assert chart.positionsOf(cat.CONJ, 0, 4) == [1] and chart.positionsOf(cat.CONJ, 2, 4) == []
+    chart[(1, 2)] = [n]
+    assert chart.positionsOf(cat.CONJ, 0, 4) == []
+    assert chart.toChart() == {(0, 1): [n], (0, 2): [n], (1, 2): [n], (1, 4): [n], (2, 4): [n]}
+
+
+def testPackNodes():
+    from node import RuleSymbol
+    nodes = [Node(rs, f"{rs.name}{n}", cat.N, [], 1.0 - n / 10, "")
+             for n, rs in enumerate([RuleSymbol.BFC1, RuleSymbol.FFA, RuleSymbol.BFC2, RuleSymbol.LEX])]
+    packed = packNodes(nodes, 10)
+    # BFC由来のノードはBFA/BFCの右の娘になれないので、FFA由来のノードとは圧縮しない
+    assert [(node.pf, [a.pf for a in node.alternatives]) for node in packed] == [
+        ("BFC10", ["BFC22"]), ("FFA1", ["LEX3"])]
+
+
+def testKBest():
+    from node import RuleSymbol
+    a = Node(RuleSymbol.LEX, "a", cat.N, [], 0.9, "", (Node(RuleSymbol.LEX, "a'", cat.N, [], 0.5, ""),))
+    b = Node(RuleSymbol.LEX, "b", cat.CONJ, [], 0.8, "", (Node(RuleSymbol.LEX, "b'", cat.CONJ, [], 0.7, ""),))
+    ab = Node(RuleSymbol.BFA, "ab", cat.N, [a, b], 0.72, "")
+    kbest = KBest()
+    # 最良の導出はノードそのもので、娘の導出は列挙されない
+    assert kbest.kth(ab, 0) is ab and len(kbest.packed) == 1
+    assert [(d.pf, round(d.score, 2)) for d in kbest.derivations(ab)] == [
+        ("ab", 0.72), ("ab'", 0.63), ("a'b", 0.4), ("a'b'", 0.35)]
+    assert [d.pf for d in islice(kbest.merge([ab, a]), 3)] == ["a", "ab", "ab'"]
+    # FFAの左の娘にFFC由来の導出は使えない。f'を使う導出は飛ばすが、その隣のf''を使う導出は列挙する
+    f = Node(RuleSymbol.FFA, "f", cat.N, [], 0.9, "", (
+        Node(RuleSymbol.FFC1, "f'", cat.N, [], 0.8, ""), Node(RuleSymbol.FFA, "f''", cat.N, [], 0.6, "")))
+    fa = Node(RuleSymbol.FFA, "fa", cat.N, [f, a], 0.81, "")
+    assert [(d.pf, round(d.score, 2)) for d in KBest().derivations(fa)] == [
+        ("fa", 0.81), ("f''a", 0.54), ("fa'", 0.45), ("f''a'", 0.3)]
+
+
+def testConjoinBest():
+    from node import RuleSymbol
+    taken = []
+
+    def lnodes():
+        for score in [0.9, 0.5, 0.1]:
+            taken.append(score)
+            yield Node(RuleSymbol.LEX, f"l{score}", cat.N, [], score, "")
+    rnodes = [Node(RuleSymbol.LEX, f"r{score}", cat.N, [], score, "") for score in [0.8, 0.7]]
+    results = conjoinBest(lnodes(), rnodes, 3)
+    assert [(n.pf, round(n.score, 2)) for n in results] == [
+        ("l0.9r0.8", 0.72), ("l0.9r0.7", 0.63), ("l0.5r0.8", 0.4)]
+    # 3番目の左のノードは必要ないので取り出されない
+    assert taken == [0.9, 0.5]
+
+
+def testParser():
+    import contextlib
+    import gc
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    from lexicon.lexicon import indexLexicon, loadLexiconIndex
+    from node import RuleSymbol
+    sentences = ["太郎を殴る", "当施設", "長い本です", "静かな猫", "太郎が本を読んだ", "花子と太郎が行く"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [simpleParse(10, sentence) for sentence in sentences]
+    parser = Parser(10)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        assert [parser.parse(sentence) for sentence in sentences] == expected
+    assert output.getvalue() == ""
+    # 各スレッドは自身のキャッシュとカウンタで解析し、モジュールの状態には触れない
+    pairs = CCG.ruleCounters.pairs
+    parser = Parser(10)
+    with ThreadPoolExecutor(3) as executor:
+        assert list(executor.map(parser.parse, sentences * 3)) == expected * 3
+        assert 1 <= len(parser.contexts) <= 3
+    assert CCG.ruleCounters.pairs == pairs
+    stats = parser.stats()
+    assert stats["cache"]["misses"] > 0 and stats["rules"]["BFA"]["fired"] > 0
+    # 終了したスレッドの文脈は解放され、その数は合計に残る
+    threads = [threading.Thread(target=parser.parse, args=(sentence,)) for sentence in sentences]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+    assert len(parser.contexts) == 0 and parser.stats()["cache"]["size"] == 0
+    assert parser.stats()["cache"]["misses"] > stats["cache"]["misses"]
+
+    def symbols(node: Node) -> set[RuleSymbol]:
+        return {node.rs}.union(*(symbols(d) for d in node.daughters))
+    rules = tuple(rule for rule in CCG.binaryRuleList if rule.symbol != RuleSymbol.BFA)
+    assert all(RuleSymbol.BFA not in symbols(node)
+               for node in Parser(10, rules=rules).parse("太郎が本を読んだ"))
+    # 空範疇のない語彙の解析器は、既定の解析器と並べて使える
+    index = loadLexiconIndex()
+    noEmptyCategories = Parser(10, lexicon=indexLexicon(
+        index.jumandic, index.automaton, list(index.items), []))
+    chart = noEmptyCategories.parseChart("太郎を殴る")
+    assert all(RuleSymbol.EC not in symbols(node) for nodes in chart.values() for node in nodes)
+    assert parser.parse("太郎を殴る") == expected[0]
+
+
 def testParse():
     # 本家実装との結果の一致を確認する
     res = simpleParse(10, "当施設")
@@ -380,6 +1016,12 @@ def testParse():
 
 
 if __name__ == "__main__":
+    testOutputCat()
+    testChartArray()
+    testPackNodes()
+    testKBest()
+    testConjoinBest()
+    testParser()
     # testParse()
     res = simpleParse(20, "当施設は傷ついた犬猫問わず受け入れます")
     for r in res[:1]:
@@ -1,7 +1,8 @@
-from dataclasses import dataclass
-from typing import TypeAlias, Union
+from typing import Any, Iterable, TypeAlias, Union
 from enum import Enum, auto
 
+from hashcons import HashConsed
+
 
 class FeatureValue(Enum):
     """Values of syntactic features of Japanese"""
@@ -81,27 +82,80 @@ class FeatureValue(Enum):
     def __repr__(self):
         return self.__str__()
 
+    # メンバは単一のインスタンスなので、Enumの(名前による)ハッシュの代わりに高速なidによるハッシュを用いる
+    __hash__ = object.__hash__
+
+
+"""
+A set of feature values is represented as a bitmask (`FeatureSet`), where `FeatureValue` with value n is the (n-1)-th bit.
+Lists of `FeatureValue`s are converted to and from bitmasks at the edges (constructors of `F`/`SF` and their `values` slot).
+"""
+FeatureSet: TypeAlias = int
+
+_bits: dict[FeatureValue, int] = {v: 1 << (v.value - 1) for v in FeatureValue}
+_decoded: dict[FeatureSet, tuple[FeatureValue, ...]] = dict()
+
+
+def toFeatureSet(values: Union[Iterable[FeatureValue], FeatureSet]) -> FeatureSet:
+    if isinstance(values, int):
+        return values
+    mask = 0
+    for v in values:
+        mask |= _bits[v]
+    return mask
+
+
+def fromFeatureSet(mask: FeatureSet) -> tuple[FeatureValue, ...]:
+    """returns the feature values in a bitmask, sorted by their values."""
+    values = _decoded.get(mask)
+    if values is None:
+        values = tuple(v for v, b in _bits.items() if mask & b)
+        _decoded[mask] = values
+    return values
 
-@dataclass
-class F:
+
+def bit(v: FeatureValue) -> FeatureSet:
+    return _bits[v]
+
+
+class F(HashConsed):
     """Syntactic feature"""
-    features: list[FeatureValue]
+    __slots__ = ("features", "featureValues")
+    __match_args__ = ("features",)
+    features: FeatureSet
+    featureValues: tuple[FeatureValue, ...]
+
+    @classmethod
+    def normalize(cls, features: Union[Iterable[FeatureValue], FeatureSet]) -> tuple[Any, ...]:
+        return (toFeatureSet(features),)
+
+    def derive(self) -> None:
+        object.__setattr__(self, "featureValues", fromFeatureSet(self.features))
 
     def __str__(self):
-        return f"F({self.features})"
+        return f"F({list(self.featureValues)})"
 
     def __repr__(self):
         return self.__str__()
 
 
-@dataclass
-class SF:
+class SF(HashConsed):
     """Shared syntactic feature (with an index)"""
+    __slots__ = ("index", "features", "featureValues")
+    __match_args__ = ("index", "features")
     index: int
-    features: list[FeatureValue]
+    features: FeatureSet
+    featureValues: tuple[FeatureValue, ...]
+
+    @classmethod
+    def normalize(cls, index: int, features: Union[Iterable[FeatureValue], FeatureSet]) -> tuple[Any, ...]:
+        return (int(index), toFeatureSet(features))
+
+    def derive(self) -> None:
+        object.__setattr__(self, "featureValues", fromFeatureSet(self.features))
 
     def __str__(self):
-        return f"SF({self.index}, {self.features})"
+        return f"SF({self.index}, {list(self.featureValues)})"
 
     def __repr__(self):
         return self.__str__()
@@ -0,0 +1,89 @@
+import threading
+from typing import Any
+from weakref import KeyedRef
+
+"""
+The table of all the live hash-consed objects, keyed by their classes and (canonical) field values.
+An object is dropped from the table when it is no longer referenced.
+"""
+_table: dict[tuple[Any, ...], KeyedRef] = dict()
+
+"""
+Guards the insertions into the table and the removals from it, so that the threads constructing equal objects at once get the same one.
+It is reentrant since an object may be dropped (and removed) while another one is inserted.
+"""
+_lock = threading.RLock()
+
+
+def _remove(ref: KeyedRef) -> None:
+    with _lock:
+        if _table.get(ref.key) is ref:
+            del _table[ref.key]
+
+
+class HashConsed:
+    """
+    A base class of immutable objects which have only one canonical instance for each distinct value.
+    Constructing an object equal to a live one returns the live one,
+    so that equality is the identity and the hash is the (constant time) identity hash.
+    Since the fields of an object are themselves canonical, the key in the table is hashed without traversing them.
+    Subclasses declare their fields in `__match_args__` (and `__slots__`),
+    and can override `normalize` to convert the arguments into hashable canonical values,
+    and `derive` to compute other slots from the fields once when the canonical instance is created.
+    """
+    __slots__ = ("__weakref__",)
+    __match_args__: tuple[str, ...] = ()
+
+    def __new__(cls, *args: Any, **kwargs: Any):
+        if kwargs:
+            args += tuple(kwargs.pop(name)
+                          for name in cls.__match_args__[len(args):] if name in kwargs)
+            if kwargs:
+                raise TypeError(
+                    f"{cls.__name__}() got unexpected keyword arguments {list(kwargs)}")
+        if len(args) != len(cls.__match_args__):
+            raise TypeError(
+                f"{cls.__name__}() takes {len(cls.__match_args__)} arguments but {len(args)} were given")
+        values = cls.normalize(*args)
+        key = (cls,) + values
+        ref = _table.get(key)
+        obj = ref() if ref is not None else None
+        if obj is None:
+            with _lock:
+                # 他のスレッドが先に作っていれば、それを使う
+                ref = _table.get(key)
+                obj = ref() if ref is not None else None
+                if obj is None:
+                    obj = object.__new__(cls)
+                    for name, value in zip(cls.__match_args__, values):
+                        object.__setattr__(obj, name, value)
+                    obj.derive()
+                    _table[key] = KeyedRef(obj, _remove, key)
+        return obj
+
+    @classmethod
+    def normalize(cls, *args: Any) -> tuple[Any, ...]:
+        return args
+
+    def derive(self) -> None:
+        pass
+
+    def values(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__match_args__)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(
+            f"cannot assign to field '{name}' of {type(self).__name__}")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(
+            f"cannot delete field '{name}' of {type(self).__name__}")
+
+    def __reduce__(self):
+        # 復元時にも__new__を通して正準なインスタンスを得る
+        return (type(self), self.values())
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={value!r}" for name,
+                           value in zip(self.__match_args__, self.values()))
+        return f"{type(self).__name__}({fields})"
@@ -0,0 +1,63 @@
+"""
+Aho-Corasick automaton to find all the occurrences of surface forms in a text in a single pass.
+"""
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+
+@dataclass
+class Automaton:
+    goto: list[dict[str, int]]
+    """transitions of the trie (state 0 is the root)"""
+    fail: list[int]
+    """the state for the longest proper suffix of the state which is also in the trie"""
+    word: list[Optional[str]]
+    """the word which ends at the state, if any"""
+    dictlink: list[int]
+    """the nearest state on the fail chain which has a word (-1 if none)"""
+
+
+def buildAutomaton(words: Iterable[str]) -> Automaton:
+    """builds an automaton over non-empty words."""
+    goto: list[dict[str, int]] = [dict()]
+    word: list[Optional[str]] = [None]
+    for w in words:
+        if w == "":
+            continue
+        s = 0
+        for c in w:
+            if c not in goto[s]:
+                goto.append(dict())
+                word.append(None)
+                goto[s][c] = len(goto) - 1
+            s = goto[s][c]
+        word[s] = w
+
+    fail = [0] * len(goto)
+    dictlink = [-1] * len(goto)
+    queue = list(goto[0].values())
+    for s in queue:
+        for c, t in goto[s].items():
+            f = fail[s]
+            while f != 0 and c not in goto[f]:
+                f = fail[f]
+            fail[t] = goto[f][c] if c in goto[f] and goto[f][c] != t else 0
+            dictlink[t] = fail[t] if word[fail[t]] is not None else dictlink[fail[t]]
+            queue.append(t)
+    return Automaton(goto, fail, word, dictlink)
+
+
+def scan(automaton: Automaton, text: str) -> Iterator[tuple[int, int, str]]:
+    """yields (start, end, word) for each occurrence of the words in `text`, in the order of `end`."""
+    goto, fail, word, dictlink = automaton.goto, automaton.fail, automaton.word, automaton.dictlink
+    s = 0
+    for end, c in enumerate(text, 1):
+        while s != 0 and c not in goto[s]:
+            s = fail[s]
+        s = goto[s].get(c, 0)
+        t = s if word[s] is not None else dictlink[s]
+        while t > 0:
+            w = word[t]
+            assert w is not None
+            yield (end - len(w), end, w)
+            t = dictlink[t]
@@ -2,30 +2,154 @@ from feature import FeatureValue as FV
 import feature
 import cat
 from node import Node
-from lexicon.myLexicon import emptyCategories, myLexicon
+from lexicon.myLexicon import emptyCategories, myLexicon, SNAPSHOT_SOURCES as MYLEXICON_SOURCES
 from lexicon.template import defS, lexicalitem, modifiableS, anyPos, verbCat, verb
 from lexicon.juman import jumanCompoundNouns
 from cat import Cat
 
 from functools import reduce
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+import os
+import threading
 
+from lexicon.snapshot import loadSnapshot
+from lexicon.automaton import Automaton, buildAutomaton, scan
+import lexicon.automaton as automatonModule
 
-def setupLexicon(sentence: str) -> list[Node]:
-    # 1. Setting up lexical items provided by JUMAN++
-    with open("source/lexicon/Juman.dic.tsv") as f:
-        jumandic = f.read()
-        jumandic = [line for line in jumandic.split("\n") if line]
-    jumandicFiltered = filter(lambda l: l[0] in sentence,
-                              map(lambda l: l.split("\t"), jumandic))
 
+JUMANDIC_PATH = os.path.join(os.path.dirname(__file__), "Juman.dic.tsv")
+LEXICON_INDEX_SNAPSHOT_PATH = os.path.join(
+    os.path.dirname(__file__), "lexiconIndex.snapshot")
+
+
+class JumanKind(Enum):
+    COMMON_NOUN = 0
+    PROPER_NAME = 1
+    OTHER = 2
+
+
+@dataclass
+class JumanEntry:
+    """A line of Juman.dic.tsv with its categories precomputed."""
+    line: int
+    hyoki: str
+    score: int
+    kind: JumanKind
+    daihyo: str
+    """daihyo/yomi"""
+    source: str
+    cats: list[Cat]
+
+
+def compileJumanDic(path: str = JUMANDIC_PATH) -> dict[str, list[JumanEntry]]:
+    """compiles Juman.dic.tsv into a dictionary from surface forms to entries."""
+    entries: dict[str, list[JumanEntry]] = dict()
+    # jumanPos2Catの結果は品詞と格フレームのみで決まるので、同じものを共有する
+    catCache: dict[tuple[str, str], list[Cat]] = dict()
+    with open(path) as f:
+        jumandic = [line for line in f.read().split("\n") if line]
+    for n, line in enumerate(jumandic):
+        # 相容れな	99	形容詞:イ形容詞アウオ段	相容れない	あいいれない	ContentW
+        hyoki, score, ct, daihyo, yomi, source, caseframe = line.split("\t")
+        if ct.startswith("名詞:普通名詞"):
+            kind, cats = JumanKind.COMMON_NOUN, []
+        elif ct.startswith("名詞:固有名詞") or ct.startswith("名詞:人名") or ct.startswith("名詞:地名") or ct.startswith("名詞:組織名"):
+            kind, cats = JumanKind.PROPER_NAME, []
+        else:
+            if (ct, caseframe) not in catCache:
+                catCache[(ct, caseframe)] = jumanPos2Cat(
+                    daihyo+"/"+yomi, ct, caseframe)
+            kind, cats = JumanKind.OTHER, catCache[(ct, caseframe)]
+        entries.setdefault(hyoki, []).append(JumanEntry(
+            n, hyoki, int(score), kind, daihyo+"/"+yomi, "(J"+source[:3]+")", cats))
+    return entries
+
+
+@dataclass(frozen=True)
+class LexiconIndex:
+    """
+    A lexicon (the private lexicon and the empty categories, with Juman.dic.tsv) and the indices over it.
+    It is not modified after it is built, so that it can be shared by the parsers in any threads.
+    """
+    jumandic: dict[str, list[JumanEntry]]
+    """entries of Juman.dic.tsv indexed by their surface forms"""
+    mylexicon: dict[str, list[int]]
+    """positions of the items of `items` indexed by their surface forms"""
+    automaton: Automaton
+    """an automaton over the surface forms of both `items` and Juman.dic.tsv"""
+    items: tuple[Node, ...] = ()
+    """the items of the private lexicon (myLexicon)"""
+    emptyCategories: tuple[Node, ...] = ()
+
+
+def compileLexiconIndex(items: list[Node] = myLexicon, path: str = JUMANDIC_PATH) -> tuple[dict[str, list[JumanEntry]], Automaton]:
+    jumandic = compileJumanDic(path)
+    surfaces = dict.fromkeys(list(jumandic) + [l.pf for l in items])
+    return jumandic, buildAutomaton(surfaces)
+
+
+def indexLexicon(jumandic: dict[str, list[JumanEntry]], automaton: Automaton,
+                 items: list[Node], emptyCategories: list[Node]) -> LexiconIndex:
+    mylexicon: dict[str, list[int]] = dict()
+    for k, l in enumerate(items):
+        mylexicon.setdefault(l.pf, []).append(k)
+    return LexiconIndex(jumandic, mylexicon, automaton, tuple(items), tuple(emptyCategories))
+
+
+_lexiconIndex: Optional[LexiconIndex] = None
+_lexiconIndexLock = threading.Lock()
+
+
+def loadLexiconIndex() -> LexiconIndex:
+    """loads the compiled index of the default lexicon (once per process)."""
+    global _lexiconIndex
+    with _lexiconIndexLock:
+        if _lexiconIndex is None:
+            jumandic, automaton = loadSnapshot(LEXICON_INDEX_SNAPSHOT_PATH, [
+                JUMANDIC_PATH, __file__, automatonModule.__file__] + MYLEXICON_SOURCES, compileLexiconIndex)
+            _lexiconIndex = indexLexicon(
+                jumandic, automaton, myLexicon, emptyCategories)
+    return _lexiconIndex
+
+
+def buildLexiconIndex(items: list[Node], emptyCategories: list[Node], path: str = JUMANDIC_PATH) -> LexiconIndex:
+    """builds the index of a lexicon other than the default one, with the Juman dictionary at `path` (without a snapshot)."""
+    jumandic, automaton = compileLexiconIndex(items, path)
+    return indexLexicon(jumandic, automaton, items, emptyCategories)
+
+
+def matchSurfaces(sentence: str, index: LexiconIndex) -> set[str]:
+    """returns the surface forms which occur in `sentence`, found in a single pass of the automaton."""
+    # 空文字列の見出しは任意の文にマッチする
+    return {w for _, _, w in scan(index.automaton, sentence)} | {""}
+
+
+def setupLexicon(sentence: str, index: Optional[LexiconIndex] = None, verbose: bool = True) -> list[Node]:
+    """returns the lexical items in `index` (the default lexicon by default) which occur in `sentence`."""
+    if index is None:
+        index = loadLexiconIndex()
+    surfaces = matchSurfaces(sentence, index)
+    # 1. Setting up lexical items provided by JUMAN++
     jumandicParsed = []
     cn: dict[str, tuple[str, int]] = dict()
     pn: dict[str, tuple[str, int]] = dict()
-    for jumanline in jumandicFiltered:
-        parseJumanLine(jumandicParsed, jumanline, cn, pn)
+    jumandicFiltered = sorted((e for w in surfaces for e in index.jumandic.get(w, [])),
+                              key=lambda e: e.line)
+    for entry in jumandicFiltered:
+        match entry.kind:
+            case JumanKind.COMMON_NOUN:
+                cn[entry.hyoki] = (entry.daihyo, entry.score)
+            case JumanKind.PROPER_NAME:
+                pn[entry.hyoki] = (entry.daihyo, entry.score)
+            case JumanKind.OTHER:
+                jumandicParsed += [lexicalitem(entry.hyoki,
+                                               entry.source, entry.score, c) for c in entry.cats]
 
     # 2. Setting up private lexicon
-    mylexiconFiltered = list(filter(lambda l: l.pf in sentence, myLexicon))
+    mylexiconFiltered = [index.items[k] for k in sorted(
+        k for w in surfaces for k in index.mylexicon.get(w, []))]
     # 3. Setting up compound nouns (returned from an execution of JUMAN)
     jumanCN = []  # jumanCompoundNouns(sentence.replace("―", "、"))
     # 4. Accumulating common nons and proper names entries
@@ -40,11 +164,12 @@ def setupLexicon(sentence: str) -> list[Node]:
     propernames = list(map(lambda l: lexicalitem(
         l[0], "(PN)", int(l[1][1]), pn_cat), pn.items()))
     # 5. 1+2+3+4
-    print([(lex.pf, lex.source, lex.rs, lex.cat) for lex in jumandicParsed])
-    print([(lex.pf, lex.source) for lex in commonnouns])
-    print([(lex.pf, lex.source) for lex in mylexiconFiltered])
-    print([(lex.pf, lex.source) for lex in propernames])
-    print([(lex.pf, lex.source) for lex in jumanCN])
+    if verbose:
+        print([(lex.pf, lex.source, lex.rs, lex.cat) for lex in jumandicParsed])
+        print([(lex.pf, lex.source) for lex in commonnouns])
+        print([(lex.pf, lex.source) for lex in mylexiconFiltered])
+        print([(lex.pf, lex.source) for lex in propernames])
+        print([(lex.pf, lex.source) for lex in jumanCN])
 
     numeration = jumandicParsed + commonnouns + \
         mylexiconFiltered + propernames + jumanCN
@@ -52,21 +177,6 @@ def setupLexicon(sentence: str) -> list[Node]:
     return numeration
 
 
-def parseJumanLine(lexicalitems: list[Node], jumanline: list[str], commonnouns: dict[str, tuple[str, int]], propernames: dict[str, tuple[str, int]]) -> None:
-    if len(jumanline) == 0:
-        return
-    # 相容れな	99	形容詞:イ形容詞アウオ段	相容れない	あいいれない	ContentW
-    hyoki, score, cat, daihyo, yomi, source, caseframe = jumanline
-    if cat.startswith("名詞:普通名詞"):
-        commonnouns[hyoki] = (daihyo+"/"+yomi, int(score))
-    elif cat.startswith("名詞:固有名詞") or cat.startswith("名詞:人名") or cat.startswith("名詞:地名") or cat.startswith("名詞:組織名"):
-        propernames[hyoki] = (daihyo+"/"+yomi, int(score))
-    else:
-        catsemlist = jumanPos2Cat(daihyo+"/"+yomi, cat, caseframe)
-        lexicalitems += list(map(lambda l: lexicalitem(hyoki,
-                             "(J"+source[:3]+")", int(score), l), catsemlist))
-
-
 def jumanPos2Cat(daihyo: str, ct: str, caseframe: str) -> list[Cat]:
     if ct.startswith("名詞:副詞的名詞"):
         return constructSubordinateConjunction(daihyo)
@@ -167,6 +277,30 @@ def lookupLexicon(word: str, lexicon: list[Node]) -> list[Node]:
     return list(filter(lambda l: l.pf == word, lexicon))
 
 
+"""
+lightblueと同様、23文字以上の語は辞書引きしない
+"""
+MAX_WORD_LENGTH = 22
+
+
+def lexicalSpans(text: str, lexicon: list[Node], index: Optional[LexiconIndex] = None) -> dict[tuple[int, int], list[Node]]:
+    """
+    finds the occurrences of the lexical items in `lexicon` (a numeration returned by `setupLexicon` with `index`) in `text`,
+    and returns the items for each span (i, j) in the order of `lexicon`.
+    """
+    if index is None:
+        index = loadLexiconIndex()
+    items: dict[str, list[Node]] = dict()
+    for l in lexicon:
+        if len(l.pf) <= MAX_WORD_LENGTH:
+            items.setdefault(l.pf, []).append(l)
+    spans: dict[tuple[int, int], list[Node]] = dict()
+    for i, j, w in scan(index.automaton, text):
+        if w in items:
+            spans[(i, j)] = items[w]
+    return spans
+
+
 def constructPredicate(daihyo: str, posF: list[FV], conjF: list[FV]) -> list[Cat]:
     return [cat.BS(defS(posF, conjF), cat.NP([feature.F([FV.Ga])]))]
 
@@ -1,3 +1,8 @@
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
 from node import Node, RuleSymbol
 from cat import Cat
 import feature
@@ -6,8 +11,11 @@ from feature import FeatureValue as FV
 import cat
 from lexicon.template import modifiableS, defS, verb, anyPos, adjective, nomPred,  nonStem, lexicalitem, m5, mmmpm, verbCat, mmpmm, mpmmm, mppmm
 from lexicon.mylexicon_hs import empty_categories, my_lexicon
+from lexicon.snapshot import loadSnapshot
+
+if TYPE_CHECKING:
+    import lark
 
-import lark
 emptyCategories: list[Node] = []
 myLexicon: list[Node] = []
 
@@ -283,53 +291,73 @@ def parse_verblex_declaration(tree: lark.Token) -> list[Node]:
     return result
 
 
-def load():
+def parse_sources() -> tuple[list[Node], list[Node]]:
+    """parses `empty_categories` and `my_lexicon` with the lark grammar."""
+    import lark
     # load the parser
     parser = lark.Lark.open("lexicon_haskell.lark",
                             rel_to=__file__, start="start")
     # parse
-    global emptyCategories
+    ecs: list[Node] = []
     tree = parser.parse(empty_categories)
     for statement in tree.children:
         assert statement.data == "statement"
         match statement.children[0].data:
             case "ec_declaration":
-                emptyCategories.append(
+                ecs.append(
                     parse_ec_declaration(statement.children[0]))
 
             case _:
                 raise Exception(f"unknown declaration {id}")
 
-    global myLexicon
+    lexicon: list[Node] = []
     tree = parser.parse(my_lexicon)
     for statement in tree.children:
         assert statement.data == "statement"
         match statement.children[0].data:
             case "ec_declaration":
-                myLexicon.append(
+                lexicon.append(
                     parse_ec_declaration(statement.children[0]))
             case "mylex_declaration":
-                myLexicon += parse_mylex_declaration(
+                lexicon += parse_mylex_declaration(
                     statement.children[0])
             case "mylex2_declaration":
-                myLexicon += parse_mylex2_declaration(
+                lexicon += parse_mylex2_declaration(
                     statement.children[0])
             case "conjsuffix_declaration":
-                myLexicon += parse_conjsuffix_declaration(
+                lexicon += parse_conjsuffix_declaration(
                     statement.children[0]
                 )
             case "conjnsuffix_declaration":
-                myLexicon += parse_conjnsuffix_declaration(
+                lexicon += parse_conjnsuffix_declaration(
                     statement.children[0]
                 )
             case "verblex_declaration":
-                myLexicon += parse_verblex_declaration(
+                lexicon += parse_verblex_declaration(
                     statement.children[0]
                 )
             case _:
                 print(statement)
                 raise Exception(
                     f"unknown declaration {statement.children[0].data}")
+    return ecs, lexicon
 
 
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), "myLexicon.snapshot")
+SNAPSHOT_SOURCES = [os.path.join(os.path.dirname(__file__), name)
+                    for name in ["lexicon_haskell.lark", "mylexicon_hs.py", "myLexicon.py"]]
+
+
+def load(use_snapshot: bool = True):
+    # パース結果はスナップショットにキャッシュされ、ソースや文法が変わると作り直される
+    if use_snapshot:
+        ecs, lexicon = loadSnapshot(
+            SNAPSHOT_PATH, SNAPSHOT_SOURCES, parse_sources)
+    else:
+        ecs, lexicon = parse_sources()
+    global emptyCategories
+    emptyCategories += ecs
+    global myLexicon
+    myLexicon += lexicon
+
 load()
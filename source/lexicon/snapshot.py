@@ -0,0 +1,72 @@
+"""
+Pickled snapshots of compiled lexical resources.
+
+A snapshot is stored together with a key computed from the files it was built from,
+so that it is rebuilt automatically whenever one of them changes.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from typing import Any, Callable, Optional
+
+SNAPSHOT_VERSION = 1
+
+LEXICON_DIR = os.path.dirname(os.path.abspath(__file__))
+
+"""
+Modules which define the objects stored in snapshots.
+Any change in them invalidates all the snapshots.
+"""
+CODE_SOURCES = [
+    os.path.join(LEXICON_DIR, "template.py"),
+    os.path.join(LEXICON_DIR, "..", "cat.py"),
+    os.path.join(LEXICON_DIR, "..", "feature.py"),
+    os.path.join(LEXICON_DIR, "..", "node.py"),
+    os.path.join(LEXICON_DIR, "..", "hashcons.py"),
+]
+
+
+def snapshotKey(sources: list[str]) -> str:
+    """computes the key of a snapshot built from the given files."""
+    h = hashlib.sha256(f"lightblue-snapshot-v{SNAPSHOT_VERSION}".encode())
+    for path in sources + CODE_SOURCES:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def readSnapshot(path: str, key: str) -> Optional[Any]:
+    try:
+        with open(path, "rb") as f:
+            stored_key, data = pickle.load(f)
+    except Exception:
+        # 存在しない・壊れている・古い形式のスナップショットは作り直す
+        return None
+    if stored_key != key:
+        return None
+    return data
+
+
+def writeSnapshot(path: str, key: str, data: Any) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump((key, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        # 書き込めない環境ではキャッシュせずに続行する
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def loadSnapshot(path: str, sources: list[str], build: Callable[[], Any]) -> Any:
+    """loads a snapshot, or builds and saves it if it is missing or outdated."""
+    if os.environ.get("LIGHTBLUE_NO_SNAPSHOT"):
+        return build()
+    key = snapshotKey(sources)
+    data = readSnapshot(path, key)
+    if data is None:
+        data = build()
+        writeSnapshot(path, key, data)
+    return data
@@ -61,6 +61,8 @@ class Node:
     daughters: list["Node"]
     score: float
     source: str
+    alternatives: tuple["Node", ...] = ()
+    """the other derivations of the same category over the same span, in the descending order of the scores"""
 
     def __eq__(self, __value: object) -> bool:
         if not isinstance(__value, Node):
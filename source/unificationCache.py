@@ -0,0 +1,110 @@
+import os
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from cat import Cat
+from node import RuleSymbol
+from lexicon.snapshot import snapshotKey, readSnapshot, writeSnapshot
+
+CacheKey = tuple[RuleSymbol, Cat, Cat]
+
+"""
+A warm-start file is only valid for the rules it was computed with,
+and for the representation of the categories, the features and the substitutions the results are made of.
+"""
+WARM_START_SOURCES = [os.path.join(os.path.dirname(__file__), name)
+                      for name in ["CCG.py", "cat.py", "feature.py", "hashcons.py", "assignment.py"]]
+
+
+class UnificationCache:
+    """
+    A bounded cache from (rule, left category, right category) to the category derived by the rule,
+    or None if the rule fails. The least recently used entries are evicted first.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[CacheKey, list] = OrderedDict()
+        """each entry is [result, number of uses]"""
+        self.hits = 0
+        self.misses = 0
+
+    def apply(self, rule: RuleSymbol, function: Callable[[Cat, Cat], Optional[Cat]], lcat: Cat, rcat: Cat) -> Optional[Cat]:
+        """returns `function(lcat, rcat)`, computing it only if it is not cached."""
+        key = (rule, lcat, rcat)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            entry[1] += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+        self.misses += 1
+        result = function(lcat, rcat)
+        if self.maxsize > 0:
+            self.entries[key] = [result, 1]
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxsize": self.maxsize}
+
+    def save(self, path: str, limit: Optional[int] = None) -> None:
+        """saves the most frequently used entries as a warm-start file."""
+        entries = sorted(self.entries.items(),
+                         key=lambda e: e[1][1], reverse=True)[:limit]
+        writeSnapshot(path, snapshotKey(WARM_START_SOURCES),
+                      [(key, result) for key, (result, _) in entries])
+
+    def load(self, path: str) -> bool:
+        """preloads the entries in a warm-start file. Returns False if the file is missing or outdated."""
+        entries = readSnapshot(path, snapshotKey(WARM_START_SOURCES))
+        if entries is None:
+            return False
+        # 頻度の高いものほど後に追加して、追い出されにくくする
+        for key, result in reversed(entries[:self.maxsize]):
+            self.entries[key] = [result, 0]
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return True
+
+
+def testUnificationCache():
+    import tempfile
+    import cat
+    calls = []
+
+    def f(l: Cat, r: Cat) -> Optional[Cat]:
+        calls.append((l, r))
+        return cat.SL(l, r) if l is cat.N else None
+
+    cache = UnificationCache(2)
+    assert cache.apply(RuleSymbol.FFA, f, cat.N, cat.CONJ) == cat.SL(
+        cat.N, cat.CONJ)
+    assert cache.apply(RuleSymbol.FFA, f, cat.CONJ, cat.N) is None
+    assert cache.apply(RuleSymbol.FFA, f, cat.CONJ, cat.N) is None
+    assert len(calls) == 2 and cache.hits == 1 and cache.misses == 2
+    # (FFA, N, CONJ)が最も古いので追い出される
+    cache.apply(RuleSymbol.BFA, f, cat.N, cat.N)
+    cache.apply(RuleSymbol.FFA, f, cat.N, cat.CONJ)
+    assert len(calls) == 4
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "warm")
+        cache.save(path)
+        warm = UnificationCache()
+        assert warm.load(path)
+        assert warm.apply(RuleSymbol.FFA, f, cat.N, cat.CONJ) == cat.SL(
+            cat.N, cat.CONJ)
+        assert len(calls) == 4 and warm.hits == 1
+    assert all(os.path.exists(source) for source in WARM_START_SOURCES)
+
+
+if __name__ == "__main__":
+    testUnificationCache()
@@ -0,0 +1,226 @@
+"""
+Parsing a sentence with the cells of the chart filled in parallel, one diagonal at a time.
+
+The cells of the same width depend only on the narrower ones,
+so each diagonal (from the width 1 to the length of the text) is split among the workers.
+Each worker keeps a replica of the chart, and the nodes which the other side already has
+are sent as references to their positions (see `NodeRegistry`),
+so that the derived nodes share their daughters with the chart as in `chartParser.parseChart`.
+
+    python wavefrontParser.py test
+"""
+import contextlib
+import io
+import multiprocessing
+import os
+import pickle
+from multiprocessing.connection import Connection
+from typing import Any, Optional
+
+import CCG
+import chartParser
+from chartParser import ChartArray, Parser, ParserContext
+from lexicon.lexicon import LexiconIndex, setupLexicon, lexicalSpans
+from node import Node, RuleSymbol
+from unificationCache import UnificationCache
+
+"""
+Texts shorter than this are parsed serially, since the coordination of the workers costs more than it saves.
+"""
+MINIMUM_LENGTH = 40
+
+NodeKey = tuple[Any, ...]
+"""("chart", i, j, n), ("lex", i, j, n) or ("ec", n)"""
+
+Cells = list[tuple[int, int, Optional[list[Node]]]]
+
+
+class NodeRegistry:
+    """
+    The keys of the nodes which both the parent and the workers have: the nodes in the chart, the lexical items and the empty categories.
+    Both sides register the same nodes in the same order, so that a key refers to the corresponding node on either side.
+    """
+
+    def __init__(self, spans: dict[tuple[int, int], list[Node]], context: ParserContext):
+        self.keys: dict[int, NodeKey] = dict()
+        self.nodes: dict[NodeKey, Node] = dict()
+        for n, ec in enumerate(context.emptyCategories):
+            self.register(("ec", n), ec.node)
+        for (i, j), nodes in spans.items():
+            for n, node in enumerate(nodes):
+                self.register(("lex", i, j, n), node)
+
+    def register(self, key: NodeKey, node: Node) -> None:
+        if id(node) not in self.keys:
+            self.keys[id(node)] = key
+            self.nodes[key] = node
+
+    def install(self, chart: ChartArray, cells: Cells) -> None:
+        for i, j, nodes in cells:
+            if nodes is not None:
+                chart[(i, j)] = nodes
+                for n, node in enumerate(nodes):
+                    self.register(("chart", i, j, n), node)
+
+    def dumps(self, cells: Cells) -> bytes:
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: self.keys.get(id(obj)) if isinstance(obj, Node) else None  # type: ignore
+        pickler.dump(cells)
+        return buffer.getvalue()
+
+    def loads(self, data: bytes) -> Cells:
+        unpickler = pickle.Unpickler(io.BytesIO(data))
+        unpickler.persistent_load = self.nodes.__getitem__  # type: ignore
+        return unpickler.load()
+
+
+def fillCells(beam: int, spans: dict[tuple[int, int], list[Node]], text: str, chart: ChartArray,
+              positions: list[tuple[int, int]], pruning: bool, context: ParserContext) -> Cells:
+    cells: Cells = []
+    for i, j in positions:
+        chartParser.fillCell(beam, spans, text, chart, i, j, pruning, context)
+        cells.append((i, j, chart.get((i, j))))
+    return cells
+
+
+def wavefrontWorker(connection: Connection, rules: tuple[CCG.BinaryRule, ...], lexicon: Optional[LexiconIndex],
+                    cacheSize: int) -> None:
+    """
+    The loop of a worker, which parses in its own context with the rules and the lexicon of the parser of the pool.
+    For each sentence, it receives the text and the lexical items,
+    and then, for each diagonal, the cells of the previous one and the positions of the cells to fill.
+    """
+    context = ParserContext(lexicon, CCG.Grammar(rules, UnificationCache(cacheSize)), verbose=False)
+    while True:
+        message = connection.recv()
+        match message:
+            case ("sentence", beam, text, spans, pruning):
+                chart = ChartArray(len(text))
+                registry = NodeRegistry(spans, context)
+            case ("fill", previous, positions):
+                registry.install(chart, registry.loads(previous))
+                connection.send_bytes(registry.dumps(
+                    fillCells(beam, spans, text, chart, positions, pruning, context)))
+            case ("close",):
+                return
+
+
+class WavefrontPool:
+    """
+    A pool of worker processes which fill the diagonals of the charts of `parser`,
+    with its beam, rules and lexicon (the default one if None).
+    The workers are kept between the sentences, and load the lexicon only once.
+    """
+
+    def __init__(self, parser: Parser, workers: int):
+        self.parser = parser
+        self.connections: list[Connection] = []
+        self.processes: list[multiprocessing.Process] = []
+        for _ in range(workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=wavefrontWorker, args=(
+                child, parser.rules, parser.lexicon, parser.cacheSize), daemon=True)
+            process.start()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def close(self) -> None:
+        for connection, process in zip(self.connections, self.processes):
+            connection.send(("close",))
+            process.join()
+        self.connections, self.processes = [], []
+
+    def __enter__(self) -> "WavefrontPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def parseChart(self, sentence: str, minimumLength: int = MINIMUM_LENGTH) -> ChartArray:
+        """`Parser.parseChart` of the parser of the pool, which gives the same chart. Short texts are parsed serially."""
+        parser = self.parser
+        text = chartParser.purifyText(sentence)
+        if sentence == "" or len(self.connections) < 2 or len(text) < minimumLength:
+            return parser.parseChart(sentence)
+        context = parser.context()
+        lexicon = setupLexicon(sentence.replace("―", "。"), parser.lexicon, context.verbose)
+        spans = lexicalSpans(text, lexicon, parser.lexicon)
+        n = len(text)
+        chart = ChartArray(n)
+        registry = NodeRegistry(spans, context)
+        for connection in self.connections:
+            connection.send(("sentence", parser.beam, text, spans, parser.pruning))
+        previous = registry.dumps([])
+        for width in range(1, n+1):
+            positions = [(i, i+width) for i in range(n-width+1)]
+            # 広い範囲ほど分割点が多いので、左右から交互に配って負荷を均す
+            chunks = [positions[k::len(self.connections)]
+                      for k in range(len(self.connections))]
+            busy = [(connection, chunk) for connection, chunk in zip(
+                self.connections, chunks) if chunk]
+            for connection, chunk in busy:
+                connection.send(("fill", previous, chunk))
+            cells: Cells = []
+            for connection, _ in busy:
+                cells += registry.loads(connection.recv_bytes())
+            cells.sort(key=lambda cell: cell[0])
+            # 送るセルのノード自体は、まだ相手にないので登録する前に書き出す
+            previous = registry.dumps(cells)
+            registry.install(chart, cells)
+        return chart
+
+
+def parseChart(beam: int, sentence: str, workers: Optional[int] = None, pruning: bool = False,
+               minimumLength: int = MINIMUM_LENGTH) -> ChartArray:
+    """
+    `chartParser.parseChart` by `chartParser.defaultParser`,
+    with a temporary pool of `workers` processes (the number of the CPUs by default).
+    """
+    parser = chartParser.defaultParser(beam, pruning)
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(chartParser.purifyText(sentence)) < minimumLength:
+        return parser.parseChart(sentence)
+    with WavefrontPool(parser, workers) as pool:
+        return pool.parseChart(sentence, minimumLength)
+
+
+def simpleParse(beam: int, sentence: str, workers: Optional[int] = None, pruning: bool = False) -> list[Node]:
+    """`chartParser.simpleParse` by `parseChart`."""
+    chart = parseChart(beam, sentence, workers, pruning)
+    match chartParser.extractParseResult(beam, chart):
+        case chartParser.Full(nodes) | chartParser.Partial(nodes):
+            return nodes
+        case _:
+            return []
+
+
+def testWavefront():
+    def dump(node: Node, shared: set[int]) -> Any:
+        # 娘がチャートのノードそのものであるかも比べる
+        return (node.rs, node.pf, node.cat, node.score, node.source, id(node) in shared,
+                [dump(d, shared) for d in node.daughters], [dump(a, shared) for a in node.alternatives])
+
+    def dumpChart(chart: ChartArray, parser: Parser) -> Any:
+        shared = set(id(node) for nodes in chart.values() for node in nodes)
+        shared.update(id(ec.node) for ec in parser.context().emptyCategories)
+        return [(key, [dump(node, shared) for node in nodes]) for key, nodes in chart.items()]
+
+    sentences = ["昨日、太郎が本を読み、花子が文を処理した", "（太郎）が行く。花子と太郎が東京へ行った"]
+    parser = Parser(10)
+    with WavefrontPool(parser, 3) as pool:
+        for sentence in sentences:
+            parallel = pool.parseChart(sentence, minimumLength=0)
+            assert dumpChart(parser.parseChart(sentence), parser) == dumpChart(parallel, parser)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert simpleParse(10, sentences[0], workers=1)[0].pf == chartParser.simpleParse(10, sentences[0])[0].pf
+    # ワーカーも解析器の規則で埋める
+    subset = Parser(10, rules=tuple(rule for rule in CCG.binaryRuleList if rule.symbol != RuleSymbol.BFA))
+    with WavefrontPool(subset, 2) as pool:
+        parallel = pool.parseChart(sentences[0], minimumLength=0)
+        assert dumpChart(subset.parseChart(sentences[0]), subset) == dumpChart(parallel, subset)
+        assert dumpChart(parallel, subset) != dumpChart(parser.parseChart(sentences[0]), parser)
+
+
+if __name__ == "__main__":
+    testWavefront()